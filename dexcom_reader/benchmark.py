@@ -0,0 +1,160 @@
+"""Benchmarks of the decode and transport hot paths.
+
+Run with
+
+  python -m dexcom_reader.benchmark [--output results.json] [--filter crc]
+
+Each benchmark reports the best rate over several repeats. Results are
+printed, and written as JSON with --output, so they can be compared between
+versions.
+"""
+import argparse
+import functools
+import json
+import platform
+import re
+import time
+
+import crc16
+import database_records
+import packetwriter
+import readdata
+import simulator
+import transport
+
+
+_BENCHMARKS = []
+
+
+def benchmark(unit, name=None):
+  """Registers a setup function returning (operation, items per call)."""
+  def decorator(func):
+    _BENCHMARKS.append((name or func.__name__, unit, func))
+    return func
+  return decorator
+
+
+def _SamplePage(record_type):
+  receiver = simulator.SimulatedReceiver(days=1)
+  record_type_index = readdata.constants.RECORD_TYPES.index(record_type)
+  page = receiver._pages[(record_type_index, 0)]
+  dex = readdata.Dexcom('benchmark')
+  return dex._ParsePageHeader(page, record_type_index, 0)
+
+
+@benchmark('MB/s')
+def crc16_page():
+  data = '\x5a' * 500
+  return lambda: crc16.crc16(data), len(data) / 1e6
+
+
+@benchmark('MB/s')
+def crc16_slow_page():
+  data = '\x5a' * 500
+  return lambda: crc16.crc16_slow(data), len(data) / 1e6
+
+
+@benchmark('records/s')
+def crc16_records_egv_page():
+  header, data = _SamplePage('EGV_DATA')
+  size = database_records.EGVRecord._ClassSize()
+  return lambda: crc16.check_records(data, size, header.numrec), header.numrec
+
+
+def _CreateBenchmark(record_type):
+  record_class = database_records.RECORD_TYPE_CLASSES[record_type]
+  header, data = _SamplePage(record_type)
+  def run():
+    for x in range(header.numrec):
+      record_class.Create(data, x)
+  return run, header.numrec
+
+
+def _ParsePageBenchmark(record_type):
+  header, data = _SamplePage(record_type)
+  dex = readdata.Dexcom('benchmark')
+  return lambda: list(dex.ParsePage(header, data)), header.numrec
+
+
+for _record_type in sorted(database_records.RECORD_TYPE_CLASSES):
+  benchmark('records/s', 'create_' + _record_type.lower())(
+      functools.partial(_CreateBenchmark, _record_type))
+  benchmark('records/s', 'parse_page_' + _record_type.lower())(
+      functools.partial(_ParsePageBenchmark, _record_type))
+
+
+@benchmark('packets/s')
+def compose_packet():
+  def run():
+    p = packetwriter.PacketWriter()
+    p.ComposePacket(readdata.constants.READ_DATABASE_PAGES,
+                    ('\x04', '\x00\x00\x00\x00', '\x03'))
+    p.PacketString()
+  return run, 1
+
+
+@benchmark('packets/s')
+def readpacket_full_page_read():
+  receiver = simulator.SimulatedReceiver(days=1)
+  reply = receiver.Handle(simulator._Packet(
+      readdata.constants.READ_DATABASE_PAGES, '\x04\x00\x00\x00\x00\x03'))
+  packets = 100
+  memory = transport.MemoryTransport(None)
+  dex = readdata.Dexcom('benchmark', transport=memory)
+  def run():
+    memory._buffer.extend(reply * packets)
+    for _ in range(packets):
+      dex.readpacket()
+  return run, packets
+
+
+@benchmark('records/s')
+def read_records_simulated_egv():
+  receiver = simulator.SimulatedReceiver(days=7)
+  dex = readdata.Dexcom(
+      'benchmark', transport=simulator.SimulatorTransport(receiver))
+  count = len(dex.ReadRecords('EGV_DATA'))
+  return lambda: dex.ReadRecords('EGV_DATA'), count
+
+
+def Measure(setup, repeat=5, min_time=0.2):
+  """Returns the best rate of setup's operation, in items per second."""
+  operation, items = setup()
+  operation()
+  best = 0
+  for _ in range(repeat):
+    calls = 0
+    started = time.time()
+    elapsed = 0
+    while elapsed < min_time:
+      operation()
+      calls += 1
+      elapsed = time.time() - started
+    best = max(best, calls * items / elapsed)
+  return best
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--filter', default='',
+                      help='only run benchmarks matching this regex')
+  parser.add_argument('--repeat', type=int, default=5)
+  parser.add_argument('--output', help='write the results as JSON here')
+  args = parser.parse_args(argv)
+  results = []
+  for name, unit, setup in _BENCHMARKS:
+    if not re.search(args.filter, name):
+      continue
+    rate = Measure(setup, args.repeat)
+    print '%-32s %14.1f %s' % (name, rate, unit)
+    results.append({'name': name, 'rate': rate, 'unit': unit})
+  if args.output:
+    with open(args.output, 'w') as f:
+      json.dump({'python': platform.python_version(),
+                 'platform': platform.platform(),
+                 'time': time.time(),
+                 'results': results}, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,141 @@
+"""Decode many archived downloads in parallel into columnar record batches.
+
+Inputs are capture files (see capture.py) or files of raw database pages,
+such as those kept by pagecache.PageCache. The pages are split into tasks
+that only name a file and the byte ranges to decode; each worker process
+memory-maps the file itself, so no page data is pickled on the way in.
+"""
+import collections
+import mmap
+import multiprocessing
+import struct
+
+import numpy
+
+import capture
+import columnar
+import constants
+import crc16
+import database_records
+import readdata
+
+
+# A 28 byte page header followed by 500 bytes of records.
+DATABASE_PAGE_LENGTH = 528
+PAGE_HEADER = struct.Struct(readdata.PAGE_HEADER_FORMAT)
+
+# Packets decoded per worker task.
+PACKETS_PER_TASK = 64
+
+
+def _DecodePages(raw, offset, length, page_count, batches):
+  page_length = length // page_count
+  for page_offset in range(offset, offset + page_count * page_length,
+                           page_length):
+    header = PAGE_HEADER.unpack_from(raw, page_offset)
+    if crc16.crc16(raw, page_offset, page_offset + PAGE_HEADER.size - 2) != (
+        header[-1]):
+      raise constants.CrcError('Page header failed CRC check at %d'
+                               % page_offset)
+    record_type = constants.RECORD_TYPES[ord(header[2])]
+    record_class = database_records.RECORD_TYPE_CLASSES.get(record_type)
+    if record_class is None:
+      continue
+    batches[record_type].append(columnar.DecodeRecords(
+        record_class, raw, header[1], page_offset + PAGE_HEADER.size))
+
+
+def _DecodeTask(task):
+  """Worker: decodes the page ranges of one file into record batches."""
+  serial, path, ranges = task
+  with open(path, 'rb') as f:
+    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+      raw = numpy.frombuffer(mapped, dtype=numpy.uint8)
+      batches = collections.defaultdict(list)
+      for offset, length, page_count in ranges:
+        _DecodePages(raw, offset, length, page_count, batches)
+      # Concatenating copies the records out of the mapping before it closes.
+      results = [(serial, record_type, numpy.concatenate(arrays))
+                 for record_type, arrays in batches.items()]
+      del raw
+    finally:
+      mapped.close()
+  return results
+
+
+def CaptureTasks(path):
+  """Splits the page reads recorded in a capture file into decode tasks."""
+  reader = capture.CaptureReader(path)
+  try:
+    serial = reader.metadata.get('serial_number')
+    ranges = []
+    request = None
+    for kind, offset, length in reader.entries:
+      if kind == capture.REQUEST:
+        request = reader.Read(offset, length)
+      elif kind == capture.RESPONSE and request is not None:
+        page_count = ord(request[-3])
+        # Skip the response packet's 4 byte header and 2 byte CRC, and any
+        # error replies, which carry no pages.
+        if (ord(request[3]) == constants.READ_DATABASE_PAGES and
+            ord(reader.Read(offset + 3, 1)) == constants.ACK and
+            length > 6 and page_count and
+            (length - 6) % page_count == 0):
+          ranges.append((offset + 4, length - 6, page_count))
+        request = None
+  finally:
+    reader.close()
+  for x in range(0, len(ranges), PACKETS_PER_TASK):
+    yield serial, path, ranges[x:x + PACKETS_PER_TASK]
+
+
+def PageFileTask(serial, path, size):
+  """A decode task for a file of consecutive raw pages."""
+  page_count = size // DATABASE_PAGE_LENGTH
+  return serial, path, [(0, page_count * DATABASE_PAGE_LENGTH, page_count)]
+
+
+def Decode(tasks, processes=None, deduplicate=True):
+  """Decodes tasks on a process pool and merges the record batches.
+
+  Args:
+     tasks: iterable of tasks from CaptureTasks or PageFileTask.
+     processes: (int) worker processes, by default one per CPU.
+     deduplicate: drop records identical, byte for byte, to an earlier record
+       of the same receiver and record type, as when downloads overlap.
+       Distinct records sharing a system time are kept.
+
+  Returns:
+     OrderedDict of (serial number, record type) to a numpy structured array
+     sorted by system time, in (serial number, record type) order.
+  """
+  pool = multiprocessing.Pool(processes)
+  try:
+    batches = collections.defaultdict(list)
+    for results in pool.imap_unordered(_DecodeTask, list(tasks)):
+      for serial, record_type, records in results:
+        batches[(serial, record_type)].append(records)
+  finally:
+    pool.close()
+    pool.join()
+  merged = collections.OrderedDict()
+  for key in sorted(batches):
+    records = numpy.concatenate(batches[key])
+    records = records[numpy.argsort(records['system_seconds'],
+                                    kind='mergesort')]
+    if deduplicate and len(records):
+      rows = numpy.ascontiguousarray(records).view(
+          numpy.dtype((numpy.void, records.dtype.itemsize)))
+      _, first = numpy.unique(rows, return_index=True)
+      records = records[numpy.sort(first)]
+    merged[key] = records
+  return merged
+
+
+def DecodeCaptures(paths, processes=None, deduplicate=True):
+  """Decodes the database pages recorded in many capture files."""
+  tasks = []
+  for path in paths:
+    tasks.extend(CaptureTasks(path))
+  return Decode(tasks, processes, deduplicate)
@@ -0,0 +1,209 @@
+"""Recording and offline replay of receiver traffic.
+
+A capture file is an append-only log. After an 8 byte file header, each entry
+is a 5 byte entry header (kind, little endian uint32 length) followed by the
+entry data:
+
+  METADATA: JSON object describing the capture, e.g. the serial number.
+  REQUEST: a command packet written to the receiver.
+  RESPONSE: the CRC-checked reply packet to the preceding request.
+
+Readers index the entries by scanning the memory-mapped file once when it is
+opened, so the format needs no separate index.
+"""
+import collections
+import json
+import mmap
+import os
+import struct
+
+import constants
+import crc16
+import readdata
+import transport
+
+
+MAGIC = 'DEXCAP\x00\x01'
+ENTRY_HEADER = struct.Struct('<BI')
+METADATA = 0
+REQUEST = 1
+RESPONSE = 2
+
+
+def _IsValidPacket(packet):
+  return (len(packet) >= 6 and
+          crc16.crc16(packet, 0, len(packet) - 2) ==
+          struct.unpack_from('<H', packet, len(packet) - 2)[0])
+
+
+class CaptureWriter(object):
+  """Appends entries to a capture file."""
+
+  def __init__(self, path):
+    new = not os.path.exists(path) or not os.path.getsize(path)
+    self._file = open(path, 'ab')
+    if new:
+      self._file.write(MAGIC)
+
+  def _Write(self, kind, data):
+    self._file.write(ENTRY_HEADER.pack(kind, len(data)))
+    self._file.write(data)
+
+  def WriteMetadata(self, **metadata):
+    self._Write(METADATA, json.dumps(metadata, sort_keys=True))
+
+  def WriteExchange(self, request, response):
+    self._Write(REQUEST, request)
+    self._Write(RESPONSE, response)
+
+  def flush(self):
+    self._file.flush()
+
+  def close(self):
+    self._file.close()
+
+
+class CaptureReader(object):
+  """Indexes the entries of a memory-mapped capture file."""
+
+  def __init__(self, path):
+    self._file = open(path, 'rb')
+    self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+    if self._map[:len(MAGIC)] != MAGIC:
+      raise constants.Error('%s is not a capture file' % path)
+    self.metadata = {}
+    # Request packet to the (offset, length) of each of its responses.
+    self.responses = collections.defaultdict(list)
+    self.entries = []
+    offset = len(MAGIC)
+    request = None
+    while offset + ENTRY_HEADER.size <= len(self._map):
+      kind, length = ENTRY_HEADER.unpack_from(self._map, offset)
+      offset += ENTRY_HEADER.size
+      if offset + length > len(self._map):
+        # A truncated final entry, from a capture that was interrupted.
+        break
+      self.entries.append((kind, offset, length))
+      if kind == METADATA:
+        self.metadata.update(json.loads(self._map[offset:offset + length]))
+      elif kind == REQUEST:
+        request = self._map[offset:offset + length]
+      elif kind == RESPONSE and request is not None:
+        self.responses[request].append((offset, length))
+        request = None
+      offset += length
+
+  def Read(self, offset, length):
+    return self._map[offset:offset + length]
+
+  def Packets(self, kind=RESPONSE):
+    """Yields the data of every entry of the given kind in order."""
+    for entry_kind, offset, length in self.entries:
+      if entry_kind == kind:
+        yield self._map[offset:offset + length]
+
+  def close(self):
+    self._map.close()
+    self._file.close()
+
+
+class CapturingTransport(transport.Transport):
+  """Wraps a transport, logging every request and its reply to a capture."""
+
+  def __init__(self, inner, writer):
+    self._inner = inner
+    self._writer = writer
+    self._request = None
+    self._response = bytearray()
+
+  def _Commit(self):
+    if self._request is not None and _IsValidPacket(self._response):
+      self._writer.WriteExchange(self._request, str(self._response))
+    self._request = None
+    del self._response[:]
+
+  def read(self, size):
+    data = self._inner.read(size)
+    self._response.extend(data)
+    return data
+
+  def readinto(self, buf):
+    count = self._inner.readinto(buf)
+    self._response.extend(memoryview(buf)[:count].tobytes())
+    return count
+
+  def write(self, data):
+    self._Commit()
+    self._request = str(data)
+    return self._inner.write(data)
+
+  def flush(self):
+    self._inner.flush()
+
+  def clear(self):
+    self._inner.clear()
+    del self._response[:]
+
+  def close(self):
+    self._Commit()
+    self._writer.close()
+    self._inner.close()
+
+
+class ReplayTransport(transport.Transport):
+  """Answers requests with the replies recorded in a capture file.
+
+  A request recorded several times is answered with its replies in recorded
+  order, repeating the last one once they run out.
+  """
+
+  def __init__(self, path):
+    self._reader = CaptureReader(path)
+    self._replayed = collections.defaultdict(int)
+    self._buffer = ''
+    self._position = 0
+
+  @property
+  def metadata(self):
+    return self._reader.metadata
+
+  def write(self, data):
+    request = str(data)
+    responses = self._reader.responses.get(request)
+    if not responses:
+      raise constants.Error('Request %r is not in the capture' % request)
+    index = min(self._replayed[request], len(responses) - 1)
+    self._replayed[request] += 1
+    self._buffer = self._reader.Read(*responses[index])
+    self._position = 0
+    return len(data)
+
+  def read(self, size):
+    data = self._buffer[self._position:self._position + size]
+    self._position += len(data)
+    return data
+
+  def clear(self):
+    self._position = len(self._buffer)
+
+  def close(self):
+    self._reader.close()
+
+
+class ReplayDexcom(readdata.Dexcom):
+  """A Dexcom reading from a capture file instead of a receiver."""
+
+  def __init__(self, path, **kwargs):
+    readdata.Dexcom.__init__(self, path, transport=ReplayTransport(path),
+                             **kwargs)
+
+
+def StartCapture(dex, path):
+  """Records all further traffic of dex to the capture file at path."""
+  writer = CaptureWriter(path)
+  dex._port = CapturingTransport(dex.port, writer)
+  # Values cached before capturing started were never recorded, so read them
+  # again through the capture for a replay to find.
+  dex.InvalidateCache()
+  writer.WriteMetadata(serial_number=dex.GetSerialNumber())
+  return writer
@@ -0,0 +1,151 @@
+"""Columnar decoding of fixed-size database records into numpy arrays.
+
+Rather than creating one record object per record, whole pages are viewed as
+structured arrays whose fields are named by the record class's COLUMNS.
+"""
+import re
+
+import numpy
+
+import constants
+import crc16
+import database_records
+import util
+
+
+_FORMAT_CHARS = {
+  'c': 'u1', 'b': 'i1', 'B': 'u1', '?': '?', 'h': 'i2', 'H': 'u2',
+  'i': 'i4', 'I': 'u4', 'l': 'i4', 'L': 'u4', 'q': 'i8', 'Q': 'u8',
+  'f': 'f4', 'd': 'f8',
+}
+_FORMAT_ITEM = re.compile(r'(\d*)([a-zA-Z?])')
+
+_dtypes = {}
+
+
+def _Table(values, size=256):
+  table = numpy.empty(size, dtype=object)
+  table[:len(values)] = values
+  return table
+
+
+# Enum names indexed by the raw field value, padded with None so that any
+# byte can be looked up.
+TREND_ARROW_TABLE = _Table(database_records.TREND_ARROWS_BY_BYTE)
+EVENT_TYPE_TABLE = _Table(constants.EVENT_TYPES)
+SESSION_STATE_TABLE = _Table(constants.INSERTION_SESSION_STATES)
+SPECIAL_GLUCOSE_TABLE = numpy.empty(constants.EGV_VALUE_MASK + 1, dtype=object)
+for _value, _meaning in constants.SPECIAL_GLUCOSE_VALUES.items():
+  SPECIAL_GLUCOSE_TABLE[_value] = _meaning
+# Indexed by [event type, event sub type].
+EVENT_SUB_TYPE_TABLE = numpy.empty((256, 256), dtype=object)
+for _event_type, _sub_types in constants.EVENT_SUB_TYPES.items():
+  EVENT_SUB_TYPE_TABLE[constants.EVENT_TYPES.index(_event_type),
+                       :len(_sub_types)] = _sub_types
+
+
+def RecordDtype(record_class):
+  """Builds the numpy dtype equivalent to record_class.FORMAT.
+
+  Single characters ('c') are decoded as uint8 so they can be masked and used
+  as table indexes directly.
+  """
+  if record_class in _dtypes:
+    return _dtypes[record_class]
+  fmt = record_class.FORMAT
+  if not fmt or fmt[0] != '<' or record_class.COLUMNS is None:
+    raise NotImplementedError('%s has no little endian FORMAT and COLUMNS'
+                              % record_class.__name__)
+  types = []
+  for count, char in _FORMAT_ITEM.findall(fmt[1:]):
+    count = int(count or 1)
+    if char == 's':
+      types.append('S%d' % count)
+    else:
+      types.extend([_FORMAT_CHARS[char]] * count)
+  if len(types) != len(record_class.COLUMNS):
+    raise constants.Error('%s FORMAT has %d fields but %d COLUMNS'
+                          % (record_class.__name__, len(types),
+                             len(record_class.COLUMNS)))
+  dtype = numpy.dtype([(name, '<' + t if t[0] in 'iuf' else t)
+                       for name, t in zip(record_class.COLUMNS, types)])
+  assert dtype.itemsize == record_class._ClassSize()
+  _dtypes[record_class] = dtype
+  return dtype
+
+
+def DecodeRecords(record_class, data, count, offset=0, check_crc=True):
+  """Views count records of record_class packed in data as a structured array.
+
+  The returned array shares memory with data.
+  """
+  dtype = RecordDtype(record_class)
+  if check_crc and count:
+    crc_ok = crc16.check_records(data, dtype.itemsize, count, offset)
+    if not all(crc_ok):
+      raise constants.CrcError('Could not parse %s record %d'
+                               % (record_class.__name__, crc_ok.index(False)))
+  raw = numpy.asarray(memoryview(data)).view(numpy.uint8)
+  return raw[offset:offset + count * dtype.itemsize].view(dtype)
+
+
+def DecodePage(record_class, header, data, check_crc=True):
+  """Decodes a database page given its parsed header."""
+  return DecodeRecords(record_class, data, header[1], check_crc=check_crc)
+
+
+def DecodePages(record_class, pages, check_crc=True):
+  """Decodes a sequence of (header, data) pages into a single array."""
+  pages = list(pages)
+  out = numpy.empty(sum(header[1] for header, _ in pages),
+                    dtype=RecordDtype(record_class))
+  position = 0
+  for header, data in pages:
+    records = DecodePage(record_class, header, data, check_crc)
+    out[position:position + len(records)] = records
+    position += len(records)
+  return out
+
+
+ReceiverTimesToDatetime64 = util.ReceiverTimesToDatetime64
+
+
+def EGVColumns(records):
+  """Decodes the masked fields of an EGVRecord array.
+
+  Returns:
+     Dict of arrays: glucose, display_only, trend_arrow (an index into
+     constants.TREND_ARROW_VALUES), system_time and display_time.
+  """
+  return {
+    'glucose': records['full_glucose'] & constants.EGV_VALUE_MASK,
+    'display_only': (records['full_glucose']
+                     & constants.EGV_DISPLAY_ONLY_MASK) != 0,
+    'trend_arrow': records['full_trend'] & constants.EGV_TREND_ARROW_MASK,
+    'system_time': ReceiverTimesToDatetime64(records['system_seconds']),
+    'display_time': ReceiverTimesToDatetime64(records['display_seconds']),
+  }
+
+
+def DecodeEnums(record_class, records):
+  """Decodes the enum fields of a whole array of records in one pass.
+
+  Returns:
+     Dict of field name to an object array of names, as the record class's
+     properties of the same name would return them.
+  """
+  if record_class is database_records.EGVRecord:
+    glucose = records['full_glucose'] & constants.EGV_VALUE_MASK
+    return {
+      'trend_arrow': TREND_ARROW_TABLE[records['full_trend']],
+      'glucose_special_meaning': SPECIAL_GLUCOSE_TABLE[glucose],
+    }
+  if record_class is database_records.EventRecord:
+    return {
+      'event_type': EVENT_TYPE_TABLE[records['event_type']],
+      'event_sub_type': EVENT_SUB_TYPE_TABLE[records['event_type'],
+                                             records['event_sub_type']],
+    }
+  if record_class is database_records.InsertionRecord:
+    return {'session_state': SESSION_STATE_TABLE[records['session_state']]}
+  return {}
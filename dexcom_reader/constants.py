@@ -9,6 +9,18 @@ class CrcError(Error):
   """Failed to CRC properly."""
 
 
+class ReceiverError(Error):
+  """Receiver replied to a command with an error."""
+
+
+class NakError(ReceiverError):
+  """Receiver rejected a command."""
+
+
+class TimeoutError(Error):
+  """Timed out waiting for the receiver."""
+
+
 DEXCOM_G4_USB_VENDOR = 0x22a3
 DEXCOM_G4_USB_PRODUCT = 0x0047
 
@@ -58,6 +70,10 @@ READ_SETUP_WIZARD_STATE = 57
 MAX_COMMAND = 59
 MAX_POSSIBLE_COMMAND = 255
 
+# A database page is a 28 byte header plus 500 bytes of record data, so at most
+# three pages fit in the 1584 byte maximum packet payload.
+MAX_DATABASE_PAGES_PER_READ = 3
+
 EGV_VALUE_MASK = 1023
 EGV_DISPLAY_ONLY_MASK = 32768
 EGV_TREND_ARROW_MASK = 15
@@ -75,6 +91,22 @@ TREND_ARROW_VALUES = [None, 'DOUBLE_UP', 'SINGLE_UP', '45_UP', 'FLAT',
                       '45_DOWN', 'SINGLE_DOWN', 'DOUBLE_DOWN', 'NOT_COMPUTABLE',
                       'OUT_OF_RANGE']
 
+INSERTION_SESSION_STATES = [None, 'REMOVED', 'EXPIRED', 'RESIDUAL_DEVIATION',
+                            'COUNTS_DEVIATION', 'SECOND_SESSION',
+                            'OFF_TIME_LOSS', 'STARTED', 'BAD_TRANSMITTER',
+                            'MANUFACTURING_MODE']
+
+EVENT_TYPES = [None, 'CARBS', 'INSULIN', 'HEALTH', 'EXCERCISE', 'MAX_VALUE']
+
+EVENT_SUB_TYPES = {'HEALTH': [None, 'ILLNESS', 'STRESS', 'HIGH_SYMPTOMS',
+                              'LOW_SYMTOMS', 'CYCLE', 'ALCOHOL'],
+                   'EXCERCISE': [None, 'LIGHT', 'MEDIUM', 'HEAVY',
+                                 'MAX_VALUE']}
+
+GLUCOSE_UNITS = (None, 'mg/dL', 'mmol/L')
+
+CLOCK_MODES = (24, 12)
+
 SPECIAL_GLUCOSE_VALUES = {0: None,
                           1: 'SENSOR_NOT_ACTIVE',
                           2: 'MINIMAL_DEVIATION',
@@ -1,3 +1,12 @@
+import binascii
+import struct
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+
 TABLE = [
   0, 4129, 8258, 12387, 16516, 20645, 24774, 28903, 33032, 37161, 41290, 
   45419, 49548, 53677, 57806, 61935, 4657, 528, 12915, 8786, 21173, 17044, 
@@ -26,12 +35,82 @@ TABLE = [
 ]
 
 
+if numpy is not None:
+  NUMPY_TABLE = numpy.array(TABLE, dtype=numpy.uint16)
+
+
 def crc16(buf, start=None, end=None):
+  """CRC-16/XMODEM of buf[start:end].
+
+  buf may be a str, bytearray or memoryview; slicing a memoryview does not copy
+  the data, and binascii.crc_hqx computes the same CRC as TABLE in C.
+  """
   if start is None:
     start = 0
   if end is None:
     end = len(buf)
+  if start or end != len(buf):
+    buf = memoryview(buf)[start:end]
+  return binascii.crc_hqx(buf, 0)
+
+
+def crc16_slow(buf, start=None, end=None):
+  if start is None:
+    start = 0
+  if end is None:
+    end = len(buf)
+  buf = bytearray(buf[start:end])
   num = 0
-  for i in range(start, end):
-    num = ((num<<8)&0xff00) ^ TABLE[((num>>8)&0xff)^ord(buf[i])]
+  for i in range(len(buf)):
+    num = ((num<<8)&0xff00) ^ TABLE[((num>>8)&0xff)^buf[i]]
   return num & 0xffff
+
+
+def _numpy_crc16_records(buf, record_size, count, offset):
+  records = numpy.asarray(memoryview(buf)).view(numpy.uint8)
+  records = records[offset:offset + count * record_size].reshape(
+      count, record_size)
+  num = numpy.zeros(count, dtype=numpy.uint16)
+  for column in range(record_size - 2):
+    num = (num << 8) ^ NUMPY_TABLE[(num >> 8) ^ records[:, column]]
+  stored = records[:, -2].astype(numpy.uint16) | (
+      records[:, -1].astype(numpy.uint16) << 8)
+  return num, stored
+
+
+def crc16_records(buf, record_size, count, offset=0, use_numpy=False):
+  """Compute the CRCs of count fixed-size records packed in buf.
+
+  Each record is record_size bytes and ends with its CRC as a little endian
+  ushort, which is not part of the checksummed data.
+
+  Args:
+     buf: str, bytearray or memoryview holding the records.
+     record_size: (int) size of each record including its CRC.
+     count: (int) number of records.
+     offset: (int) position of the first record in buf.
+     use_numpy: vectorize across records with numpy. The per-column loop is
+       slower than crc_hqx on each record for page-sized batches, so this is
+       off by default.
+
+  Returns:
+     (computed, stored) lists of CRCs, one entry per record.
+  """
+  if use_numpy and count:
+    computed, stored = _numpy_crc16_records(buf, record_size, count, offset)
+    return computed.tolist(), stored.tolist()
+  view = memoryview(buf)
+  computed = []
+  stored = []
+  for x in range(count):
+    record_start = offset + x * record_size
+    record_end = record_start + record_size
+    computed.append(binascii.crc_hqx(view[record_start:record_end - 2], 0))
+    stored.append(struct.unpack_from('<H', view, record_end - 2)[0])
+  return computed, stored
+
+
+def check_records(buf, record_size, count, offset=0, use_numpy=False):
+  """Returns a list of booleans, True where a record's CRC matches."""
+  computed, stored = crc16_records(buf, record_size, count, offset, use_numpy)
+  return [c == s for c, s in zip(computed, stored)]
@@ -3,10 +3,41 @@ import constants
 import struct
 import util
 import binascii
+import datetime
+
+
+# Trend arrow names indexed by the whole trend byte.
+TREND_ARROWS_BY_BYTE = [
+  constants.TREND_ARROW_VALUES[x & constants.EGV_TREND_ARROW_MASK]
+  if x & constants.EGV_TREND_ARROW_MASK < len(constants.TREND_ARROW_VALUES)
+  else None for x in range(256)]
+
+
+class lazy_property(object):
+  """A read-only property computed once and cached in the slot '_<name>'."""
+
+  def __init__(self, func):
+    self._func = func
+    self._slot = '_' + func.__name__
+    self.__doc__ = func.__doc__
+
+  def __get__(self, obj, cls):
+    if obj is None:
+      return self
+    try:
+      return getattr(obj, self._slot)
+    except AttributeError:
+      value = self._func(obj)
+      setattr(obj, self._slot, value)
+      return value
 
 
 class BaseDatabaseRecord(object):
+  # raw_data is a memoryview into the page the record was read from.
+  __slots__ = ('data', 'raw_data')
   FORMAT = None
+  # Names of the fields unpacked from FORMAT, used for columnar decoding.
+  COLUMNS = None
 
   @classmethod
   def _CheckFormat(cls):
@@ -16,8 +47,14 @@ class BaseDatabaseRecord(object):
 
   @classmethod
   def _ClassFormat(cls):
-    cls._CheckFormat()
-    return struct.Struct(cls.FORMAT)
+    # Compiled once per class; looked up in the class's own __dict__ so that
+    # subclasses with a different FORMAT get their own Struct.
+    fmt = cls.__dict__.get('_struct')
+    if fmt is None:
+      cls._CheckFormat()
+      fmt = struct.Struct(cls.FORMAT)
+      cls._struct = fmt
+    return fmt
 
   @classmethod
   def _ClassSize(cls):
@@ -25,8 +62,7 @@ class BaseDatabaseRecord(object):
 
   @property
   def FMT(self):
-    self._CheckFormat()
-    return _ClassFormat()
+    return self._ClassFormat()
 
   @property
   def SIZE(self):
@@ -46,28 +82,42 @@ class BaseDatabaseRecord(object):
     if local_crc != self.crc:
       raise constants.CrcError('Could not parse %s' % self.__class__.__name__)
 
+  def __reduce__(self):
+    return (self.__class__, (self.data, memoryview(self.raw_data).tobytes()))
+
   def dump(self):
-    return ''.join('\\x%02x' % ord(c) for c in self.raw_data)
+    return ''.join('\\x%02x' % c for c in bytearray(self.raw_data))
 
   def calculate_crc(self):
     return crc16.crc16(self.raw_data[:-2])
 
   @classmethod
   def Create(cls, data, record_counter):
-    offset = record_counter * cls._ClassSize()
-    raw_data = data[offset:offset + cls._ClassSize()]
-    unpacked_data = cls._ClassFormat().unpack(raw_data)
-    return cls(unpacked_data, raw_data)
+    fmt = cls._ClassFormat()
+    offset = record_counter * fmt.size
+    raw_data = memoryview(data)[offset:offset + fmt.size]
+    return cls(fmt.unpack(raw_data), raw_data)
+
+  @classmethod
+  def CreateMany(cls, data, count, offset=0):
+    """Yields count consecutive records packed in data from offset."""
+    fmt = cls._ClassFormat()
+    size = fmt.size
+    unpack_from = fmt.unpack_from
+    view = memoryview(data)
+    for x in range(offset, offset + count * size, size):
+      yield cls(unpack_from(view, x), view[x:x + size])
 
 
 class GenericTimestampedRecord(BaseDatabaseRecord):
+  __slots__ = ('_system_time', '_display_time')
   FIELDS = [ ]
   BASE_FIELDS = [ 'system_time', 'display_time' ]
-  @property
+  @lazy_property
   def system_time(self):
     return util.ReceiverTimeToTime(self.data[0])
 
-  @property
+  @lazy_property
   def display_time(self):
     return util.ReceiverTimeToTime(self.data[1])
 
@@ -75,39 +125,43 @@ class GenericTimestampedRecord(BaseDatabaseRecord):
   def to_dict (self):
     d = dict( )
     for k in self.BASE_FIELDS + self.FIELDS:
-      d[k] = getattr(self, k)
-      if callable(getattr(d[k], 'isoformat', None)):
-        d[k] = d[k].isoformat( )
+      v = getattr(self, k)
+      if isinstance(v, datetime.datetime):
+        v = v.isoformat( )
+      d[k] = v
     return d
 
 class GenericXMLRecord(GenericTimestampedRecord):
+  __slots__ = ('_xmldata',)
   FORMAT = '<II490sH'
+  COLUMNS = ('system_seconds', 'display_seconds', 'xmldata', 'crc')
 
-  @property
+  @lazy_property
   def xmldata(self):
     data = self.data[2].replace("\x00", "")
     return data
 
 
 class InsertionRecord(GenericTimestampedRecord):
+  __slots__ = ('_insertion_time', '_session_state')
   FORMAT = '<3IcH'
+  COLUMNS = ('system_seconds', 'display_seconds', 'insertion_seconds',
+             'session_state', 'crc')
 
-  @property
+  @lazy_property
   def insertion_time(self):
     return util.ReceiverTimeToTime(self.data[2])
 
-  @property
+  @lazy_property
   def session_state(self):
-    states = [None, 'REMOVED', 'EXPIRED', 'RESIDUAL_DEVIATION',
-              'COUNTS_DEVIATION', 'SECOND_SESSION', 'OFF_TIME_LOSS',
-              'STARTED', 'BAD_TRANSMITTER', 'MANUFACTURING_MODE']
-    return states[ord(self.data[3])]
+    return constants.INSERTION_SESSION_STATES[ord(self.data[3])]
 
   def __repr__(self):
     return '%s:  state=%s' % (self.display_time, self.session_state)
 
 
 class Calibration(GenericTimestampedRecord):
+  __slots__ = ()
   @property
   def raw(self):
     return binascii.hexlify(bytearray(self.data))
@@ -116,13 +170,16 @@ class Calibration(GenericTimestampedRecord):
     return '%s: CAL SET:%s' % (self.display_time, self.raw)
 
 class MeterRecord(GenericTimestampedRecord):
+  __slots__ = ('_meter_time',)
   FORMAT = '<2IHIH'
+  COLUMNS = ('system_seconds', 'display_seconds', 'meter_glucose',
+             'meter_seconds', 'crc')
 
   @property
   def meter_glucose(self):
     return self.data[2]
 
-  @property
+  @lazy_property
   def meter_time(self):
     return util.ReceiverTimeToTime(self.data[3])
 
@@ -131,25 +188,23 @@ class MeterRecord(GenericTimestampedRecord):
 
 
 class EventRecord(GenericTimestampedRecord):
+  __slots__ = ('_event_type', '_event_sub_type')
   # sys_time,display_time,glucose,meter_time,crc
   FORMAT = '<2I2c2IH'
+  COLUMNS = ('system_seconds', 'display_seconds', 'event_type',
+             'event_sub_type', 'event_seconds', 'event_value', 'crc')
 
-  @property
+  @lazy_property
   def event_type(self):
-    event_types = [None, 'CARBS', 'INSULIN', 'HEALTH', 'EXCERCISE',
-                    'MAX_VALUE']
-    return event_types[ord(self.data[2])]
+    return constants.EVENT_TYPES[ord(self.data[2])]
 
-  @property
+  @lazy_property
   def event_sub_type(self):
-    subtypes = {'HEALTH': [None, 'ILLNESS', 'STRESS', 'HIGH_SYMPTOMS',
-                            'LOW_SYMTOMS', 'CYCLE', 'ALCOHOL'],
-                'EXCERCISE': [None, 'LIGHT', 'MEDIUM', 'HEAVY',
-                              'MAX_VALUE']}
-    if self.event_type in subtypes:
-      return subtypes[self.event_type][ord(self.data[3])]
+    subtypes = constants.EVENT_SUB_TYPES.get(self.event_type)
+    if subtypes is not None:
+      return subtypes[ord(self.data[3])]
 
-  @property
+  @lazy_property
   def display_time(self):
     return util.ReceiverTimeToTime(self.data[4])
 
@@ -165,9 +220,12 @@ class EventRecord(GenericTimestampedRecord):
                                     self.event_sub_type, self.event_value)
 
 class SensorRecord(GenericTimestampedRecord):
+  __slots__ = ()
   # uint, uint, uint, uint, ushort
   # (system_seconds, display_seconds, unfiltered, filtered, rssi, crc)
   FORMAT = '<2IIIHH'
+  COLUMNS = ('system_seconds', 'display_seconds', 'unfiltered', 'filtered',
+             'rssi', 'crc')
   # (unfiltered, filtered, rssi)
   FIELDS = ['unfiltered', 'filtered', 'rssi']
   @property
@@ -180,7 +238,7 @@ class SensorRecord(GenericTimestampedRecord):
 
   @property
   def rssi(self):
-    return self.data[3]
+    return self.data[4]
 
   """
   def to_dict (self):
@@ -194,10 +252,13 @@ class SensorRecord(GenericTimestampedRecord):
 
 
 class EGVRecord(GenericTimestampedRecord):
+  __slots__ = ('_trend_arrow', '_glucose_special_meaning')
   # uint, uint, ushort, byte, ushort
   # (system_seconds, display_seconds, glucose, trend_arrow, crc)
   FIELDS = ['glucose', 'trend_arrow']
   FORMAT = '<2IHcH'
+  COLUMNS = ('system_seconds', 'display_seconds', 'full_glucose', 'full_trend',
+             'crc')
 
   @property
   def full_glucose(self):
@@ -215,19 +276,17 @@ class EGVRecord(GenericTimestampedRecord):
   def glucose(self):
     return self.full_glucose & constants.EGV_VALUE_MASK
 
-  @property
+  @lazy_property
   def glucose_special_meaning(self):
-    if self.glucose in constants.SPECIAL_GLUCOSE_VALUES:
-      return constants.SPECIAL_GLUCOSE_VALUES[self.glucose]
+    return constants.SPECIAL_GLUCOSE_VALUES.get(self.glucose)
 
   @property
   def is_special(self):
     return self.glucose_special_meaning is not None
 
-  @property
+  @lazy_property
   def trend_arrow(self):
-    arrow_value = ord(self.full_trend) & constants.EGV_TREND_ARROW_MASK
-    return constants.TREND_ARROW_VALUES[arrow_value]
+    return TREND_ARROWS_BY_BYTE[ord(self.full_trend)]
 
   def __repr__(self):
     if self.is_special:
@@ -235,3 +294,14 @@ class EGVRecord(GenericTimestampedRecord):
     else:
       return '%s: CGM BG:%s (%s) DO:%s' % (self.display_time, self.glucose,
                                            self.trend_arrow, self.display_only)
+
+
+# Record classes for the fixed-size record types, by name in
+# constants.RECORD_TYPES.
+RECORD_TYPE_CLASSES = {
+  'USER_EVENT_DATA': EventRecord,
+  'METER_DATA': MeterRecord,
+  'INSERTION_TIME': InsertionRecord,
+  'EGV_DATA': EGVRecord,
+  'SENSOR_DATA': SensorRecord,
+}
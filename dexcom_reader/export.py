@@ -0,0 +1,201 @@
+"""Streaming export of records to CSV, JSON Lines and a columnar format.
+
+Records are converted a chunk at a time: each chunk is packed into a numpy
+structured array, its columns decoded and its timestamps converted in bulk,
+and then written out, so memory use stays constant however many records are
+exported. Both record objects (e.g. from Dexcom.IterRecords) and structured
+arrays from the columnar decoder are accepted.
+"""
+import collections
+import csv
+import json
+import struct
+
+import numpy
+
+import columnar
+import constants
+import database_records
+import util
+
+
+DEFAULT_CHUNK_SIZE = 4096
+
+# Event time columns renamed to match EventRecord's properties.
+_EVENT_TIME_COLUMNS = {
+  'display_time': 'record_display_time',
+  'event_time': 'display_time',
+}
+
+
+def ExportColumns(record_class, records):
+  """Decodes a structured array of records into named export columns.
+
+  Receiver seconds become datetime64 '<name>_time' columns, EGV glucose is
+  unmasked, insulin event values are scaled to units and enum fields are
+  decoded to their names. The CRC is dropped.
+
+  As with EventRecord.display_time, an event's 'display_time' is the time
+  the event was entered for; the record's own display time is exported as
+  'record_display_time'.
+  """
+  enums = columnar.DecodeEnums(record_class, records)
+  columns = collections.OrderedDict()
+  for name in record_class.COLUMNS:
+    if name == 'crc':
+      continue
+    if name.endswith('_seconds'):
+      column = name[:-len('_seconds')] + '_time'
+      if record_class is database_records.EventRecord:
+        column = _EVENT_TIME_COLUMNS.get(column, column)
+      columns[column] = util.ReceiverTimesToDatetime64(records[name])
+    elif name == 'full_glucose':
+      egv = columnar.EGVColumns(records)
+      columns['glucose'] = egv['glucose']
+      columns['display_only'] = egv['display_only']
+    elif name == 'full_trend':
+      columns['trend_arrow'] = enums['trend_arrow']
+    elif name in enums:
+      columns[name] = enums[name]
+    elif name == 'event_value':
+      insulin = constants.EVENT_TYPES.index('INSULIN')
+      columns[name] = numpy.where(records['event_type'] == insulin,
+                                  records[name] / 100.0, records[name])
+    else:
+      columns[name] = records[name]
+  return columns
+
+
+def _Chunks(record_class, records, chunk_size):
+  if isinstance(records, numpy.ndarray):
+    for x in range(0, len(records), chunk_size):
+      yield records[x:x + chunk_size]
+    return
+  dtype = columnar.RecordDtype(record_class)
+  raw = bytearray()
+  count = 0
+  for record in records:
+    raw.extend(memoryview(record.raw_data).tobytes())
+    count += 1
+    if count == chunk_size:
+      yield numpy.frombuffer(raw, dtype=dtype).copy()
+      raw = bytearray()
+      count = 0
+  if count:
+    yield numpy.frombuffer(raw, dtype=dtype).copy()
+
+
+def _AsText(column):
+  if column.dtype.kind == 'M':
+    return numpy.datetime_as_string(column).tolist()
+  return column.tolist()
+
+
+class CsvWriter(object):
+  def __init__(self, f):
+    self._writer = csv.writer(f)
+    self._header = False
+
+  def WriteChunk(self, columns):
+    if not self._header:
+      self._writer.writerow(columns.keys())
+      self._header = True
+    self._writer.writerows(zip(*[_AsText(c) for c in columns.values()]))
+
+  def Close(self):
+    pass
+
+
+class JsonLinesWriter(object):
+  def __init__(self, f):
+    self._file = f
+
+  def WriteChunk(self, columns):
+    names = columns.keys()
+    for row in zip(*[_AsText(c) for c in columns.values()]):
+      self._file.write(json.dumps(dict(zip(names, row)), sort_keys=True))
+      self._file.write('\n')
+
+  def Close(self):
+    pass
+
+
+COLUMNAR_MAGIC = 'DEXCOL\x00\x01'
+_LENGTH = struct.Struct('<I')
+
+
+class ColumnarWriter(object):
+  """Writes chunks as contiguous binary columns.
+
+  After an 8 byte file header, each chunk is a little endian uint32 length, a
+  JSON description {"rows": n, "columns": [[name, dtype], ...]} of that
+  length, and then each column's raw bytes in order. Text columns are
+  stored as fixed-width byte strings.
+  """
+
+  def __init__(self, f):
+    self._file = f
+    self._file.write(COLUMNAR_MAGIC)
+
+  def WriteChunk(self, columns):
+    arrays = []
+    for name, column in columns.items():
+      if column.dtype == object:
+        column = column.astype(str)
+      arrays.append((name, numpy.ascontiguousarray(column)))
+    rows = len(arrays[0][1]) if arrays else 0
+    description = json.dumps({
+      'rows': rows,
+      'columns': [[name, column.dtype.str] for name, column in arrays],
+    })
+    self._file.write(_LENGTH.pack(len(description)))
+    self._file.write(description)
+    for _, column in arrays:
+      self._file.write(column.tobytes())
+
+  def Close(self):
+    pass
+
+
+def ReadColumnar(f):
+  """Yields each chunk of a columnar export as an OrderedDict of arrays."""
+  if f.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+    raise constants.Error('Not a columnar export')
+  while True:
+    length = f.read(_LENGTH.size)
+    if not length:
+      return
+    description = json.loads(f.read(_LENGTH.unpack(length)[0]))
+    columns = collections.OrderedDict()
+    for name, dtype in description['columns']:
+      dtype = numpy.dtype(str(dtype))
+      data = f.read(dtype.itemsize * description['rows'])
+      columns[name] = numpy.frombuffer(data, dtype=dtype)
+    yield columns
+
+
+WRITERS = {
+  'csv': CsvWriter,
+  'jsonl': JsonLinesWriter,
+  'columnar': ColumnarWriter,
+}
+
+
+def Export(record_class, records, writer, chunk_size=DEFAULT_CHUNK_SIZE):
+  """Writes records of record_class to writer a chunk at a time.
+
+  Args:
+     record_class: the database_records class of the records.
+     records: iterable of record objects, or a structured array of them.
+     writer: a CsvWriter, JsonLinesWriter or ColumnarWriter.
+     chunk_size: (int) records converted at a time.
+
+  Returns:
+     Number of records written.
+  """
+  count = 0
+  for chunk in _Chunks(record_class, records, chunk_size):
+    writer.WriteChunk(ExportColumns(record_class, chunk))
+    count += len(chunk)
+  writer.Close()
+  return count
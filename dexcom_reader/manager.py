@@ -0,0 +1,101 @@
+"""Download several receivers at the same time."""
+import Queue
+import sys
+import threading
+
+import readdata
+
+
+DEFAULT_RECORD_TYPES = ('EGV_DATA', 'SENSOR_DATA', 'METER_DATA',
+                        'USER_EVENT_DATA', 'INSERTION_TIME')
+
+# Queued by a worker when it has finished with its ports.
+_DONE = object()
+
+
+class DownloadManager(object):
+  """Downloads records from every attached receiver concurrently.
+
+  Each receiver is read by its own worker thread, with at most max_workers
+  downloads in flight. Records are handed to sink in the calling thread, one
+  page at a time, as sink(serial_number, record_type, records), so the sink
+  does not need to be thread safe. If sink raises, the workers stop after
+  their current page and Run re-raises the error once they have finished.
+  """
+
+  def __init__(self, sink, record_types=DEFAULT_RECORD_TYPES, max_workers=4,
+               queue_size=64, dexcom_class=readdata.Dexcom):
+    self._sink = sink
+    self._record_types = record_types
+    self._max_workers = max_workers
+    self._queue_size = queue_size
+    self._dexcom_class = dexcom_class
+
+  def _Download(self, port, results, stop):
+    dex = self._dexcom_class(port)
+    try:
+      serial = dex.GetSerialNumber()
+      for record_type in self._record_types:
+        for header, data in dex.IterRawPages(record_type):
+          if stop.is_set():
+            return serial
+          results.put((serial, record_type, list(dex.ParsePage(header, data))))
+      return serial
+    finally:
+      dex.Disconnect()
+
+  def _Worker(self, ports, results, status, stop):
+    try:
+      while not stop.is_set():
+        try:
+          port = ports.get_nowait()
+        except Queue.Empty:
+          return
+        try:
+          status[port] = self._Download(port, results, stop)
+        except Exception as e:
+          status[port] = e
+    finally:
+      results.put(_DONE)
+
+  def Run(self, ports=None):
+    """Download the given ports, or every receiver found.
+
+    Returns:
+       Dict of port to the receiver's serial number, or to the exception that
+       stopped its download.
+    """
+    if ports is None:
+      ports = self._dexcom_class.FindDevices()
+    ports = list(ports)
+    pending = Queue.Queue()
+    for port in ports:
+      pending.put(port)
+    results = Queue.Queue(self._queue_size)
+    status = {}
+    stop = threading.Event()
+    workers = []
+    for _ in range(min(self._max_workers, len(ports))):
+      worker = threading.Thread(target=self._Worker,
+                                args=(pending, results, status, stop))
+      worker.daemon = True
+      worker.start()
+      workers.append(worker)
+    running = len(workers)
+    error = None
+    while running:
+      item = results.get()
+      if item is _DONE:
+        running -= 1
+      elif error is None:
+        try:
+          self._sink(*item)
+        except Exception:
+          # Keep draining results so no worker stays blocked on the queue.
+          error = sys.exc_info()
+          stop.set()
+    for worker in workers:
+      worker.join()
+    if error is not None:
+      raise error[0], error[1], error[2]
+    return status
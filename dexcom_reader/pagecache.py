@@ -0,0 +1,95 @@
+"""A size bounded on-disk cache of raw database pages.
+
+Each page is stored in its own file, exactly as read from the receiver
+(header followed by page data), at
+
+  <root>/<serial number>/<record type>/<page>.page
+
+so a page can be read or mmapped directly. Only pages that are full are
+cached, since a full page never changes. The least recently used pages are
+evicted once the cache grows past max_bytes.
+
+The files are listed once when the cache is opened; after that an in-memory
+index ordered by last use is kept, so lookups and eviction never walk the
+cache directory.
+"""
+import collections
+import os
+import re
+
+
+_PAGE_FILE = re.compile(r'^\d+\.page$')
+
+
+class PageCache(object):
+
+  def __init__(self, root, max_bytes=64 * 1024 * 1024):
+    self._root = root
+    self._max_bytes = max_bytes
+    self._dirs = set()
+    # Path to size in bytes, least recently used first.
+    self._index = collections.OrderedDict()
+    files = []
+    for dirpath, _, filenames in os.walk(self._root):
+      for filename in filenames:
+        if _PAGE_FILE.match(filename):
+          path = os.path.join(dirpath, filename)
+          stat = os.stat(path)
+          files.append((stat.st_mtime, path, stat.st_size))
+    for _, path, size in sorted(files):
+      self._index[path] = size
+    self._size = sum(self._index.values())
+
+  def _Path(self, serial, record_type, page):
+    return os.path.join(self._root, serial, record_type, '%d.page' % page)
+
+  def _Remove(self, path):
+    self._size -= self._index.pop(path)
+    try:
+      os.remove(path)
+    except OSError:
+      pass
+
+  def Get(self, serial, record_type, page):
+    """Returns the cached page bytes, or None."""
+    path = self._Path(serial, record_type, page)
+    size = self._index.pop(path, None)
+    if size is None:
+      return None
+    try:
+      with open(path, 'rb') as f:
+        data = f.read()
+    except IOError:
+      self._size -= size
+      return None
+    # Mark the page as recently used, here and for the next session.
+    self._index[path] = size
+    os.utime(path, None)
+    return data
+
+  def Put(self, serial, record_type, page, data):
+    path = self._Path(serial, record_type, page)
+    directory = os.path.dirname(path)
+    if directory not in self._dirs:
+      if not os.path.isdir(directory):
+        os.makedirs(directory)
+      self._dirs.add(directory)
+    if path in self._index:
+      self._size -= self._index.pop(path)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+      f.write(data)
+    os.rename(tmp_path, path)
+    self._index[path] = len(data)
+    self._size += len(data)
+    if self._size > self._max_bytes:
+      self.Evict()
+
+  def Evict(self):
+    """Removes least recently used pages until within max_bytes."""
+    while self._size > self._max_bytes and self._index:
+      self._Remove(next(iter(self._index)))
+
+  @property
+  def size(self):
+    return self._size
@@ -0,0 +1,103 @@
+"""Plan a full download from the receiver's partition layout."""
+import collections
+import time
+
+import numpy
+
+import columnar
+import constants
+import database_records
+
+
+PartitionPlan = collections.namedtuple(
+    'PartitionPlan', ['record_type', 'start_page', 'end_page', 'pages',
+                      'record_length', 'max_records'])
+
+
+class DownloadPlan(object):
+  """The pages and record counts to download, read in one pass up front.
+
+  Partition info gives the record length and page data length of every
+  partition, so the number of records in each page range is known (as an
+  upper bound, the last page may be partially filled) before any page is read.
+
+  Args:
+     dex: a readdata.Dexcom.
+     record_types: record types to download, by default every fixed-size type.
+  """
+
+  def __init__(self, dex, record_types=None):
+    self._dex = dex
+    if record_types is None:
+      record_types = [x for x in constants.RECORD_TYPES
+                      if x in database_records.RECORD_TYPE_CLASSES]
+    partition_info = dex.DataPartitions()
+    page_data_length = int(partition_info.get('PageDataLength', 500))
+    record_lengths = {}
+    for partition in partition_info.findall('Partition'):
+      record_type = constants.RECORD_TYPES[int(partition.get('Id'))]
+      record_lengths[record_type] = int(partition.get('RecordLength'))
+    self.partitions = []
+    for record_type in record_types:
+      start, end = dex._PageRange(record_type)
+      pages = max(end - start, 0)
+      record_length = record_lengths.get(record_type)
+      if record_length is None:
+        record_length = database_records.RECORD_TYPE_CLASSES[
+            record_type]._ClassSize()
+      self.partitions.append(PartitionPlan(
+          record_type, start, end - 1, pages, record_length,
+          pages * (page_data_length // record_length)))
+
+  @property
+  def total_pages(self):
+    return sum(p.pages for p in self.partitions)
+
+  @property
+  def max_records(self):
+    return sum(p.max_records for p in self.partitions)
+
+  def Estimate(self, seconds_per_page):
+    """Returns the estimated seconds to download every planned page."""
+    return self.total_pages * seconds_per_page
+
+  def Execute(self, progress=None, as_arrays=False):
+    """Download every planned partition.
+
+    Args:
+       progress: called after each page as
+         progress(record_type, pages_done, total_pages, eta_seconds).
+       as_arrays: decode records into numpy structured arrays rather than
+         record objects.
+
+    Returns:
+       Dict of record type to its records.
+    """
+    results = {}
+    total_pages = self.total_pages
+    pages_done = 0
+    started = time.time()
+    for plan in self.partitions:
+      record_class = database_records.RECORD_TYPE_CLASSES[plan.record_type]
+      if as_arrays:
+        records = numpy.empty(plan.max_records,
+                              dtype=columnar.RecordDtype(record_class))
+      else:
+        records = [None] * plan.max_records
+      count = 0
+      if plan.pages:
+        for header, data in self._dex.IterRawPages(
+            plan.record_type, plan.start_page, plan.end_page):
+          if as_arrays:
+            page = columnar.DecodePage(record_class, header, data)
+          else:
+            page = list(self._dex.ParsePage(header, data))
+          records[count:count + len(page)] = page
+          count += len(page)
+          pages_done += 1
+          if progress is not None:
+            elapsed = time.time() - started
+            eta = elapsed / pages_done * (total_pages - pages_done)
+            progress(plan.record_type, pages_done, total_pages, eta)
+      results[plan.record_type] = records[:count]
+    return results
@@ -1,23 +1,63 @@
+import argparse
+import columnar
 import crc16
 import constants
 import database_records
 import datetime
-import serial
+import export
+import collections
+import functools
+import Queue
 import sys
+import threading
 import time
 import packetwriter
+import transport
 import struct
 import re
 import util
 import xml.etree.ElementTree as ET
+import numbers
 import numpy
 import platform
 
 
+# first index (uint), numrec (uint), record_type (byte), revision (byte),
+# page# (uint), r1 (uint), r2 (uint), r3 (uint), ushort (Crc)
+PAGE_HEADER_FORMAT = '<2I2c4IH'
+PageHeader = collections.namedtuple(
+    'PageHeader', ['first_index', 'numrec', 'record_type', 'revision',
+                   'page_number', 'r1', 'r2', 'r3', 'crc'])
+
+
+def session_cached(method):
+  """Caches the result of a Dexcom method taking no arguments.
+
+  Results are kept until Dexcom.InvalidateCache, or for the number of seconds
+  given for the method in Dexcom.CACHE_TTLS.
+  """
+  name = method.__name__
+
+  @functools.wraps(method)
+  def wrapper(self):
+    now = time.time()
+    cached = self._cache.get(name)
+    if cached is not None:
+      value, expires = cached
+      if expires is None or now < expires:
+        return value
+    value = method(self)
+    ttl = self.CACHE_TTLS.get(name)
+    self._cache[name] = (value, None if ttl is None else now + ttl)
+    return value
+  return wrapper
+
+
 class ReadPacket(object):
   def __init__(self, command, data):
     self._command = command
-    self._data = data
+    self._data = memoryview(data)
+    self._bytes = None
 
   @property
   def command(self):
@@ -25,15 +65,45 @@ class ReadPacket(object):
 
   @property
   def data(self):
+    """The payload as a string, copied out of the packet buffer once."""
+    if self._bytes is None:
+      self._bytes = self._data.tobytes()
+    return self._bytes
+
+  @property
+  def view(self):
+    """The payload as a memoryview into the packet buffer."""
     return self._data
 
 
+class _ReaderError(object):
+  """Carries an exception from a reader thread to the consuming thread."""
+  __slots__ = ('exc_info',)
+
+  def __init__(self, exc_info):
+    self.exc_info = exc_info
+
+
 class Dexcom(object):
+  # Seconds that session_cached values which can change during a session are
+  # kept for.
+  CACHE_TTLS = {
+    'ReadBatteryLevel': 60,
+    'ReadBatteryState': 60,
+    'ReadSystemTimeOffset': 300,
+    'ReadDisplayTimeOffset': 300,
+  }
+
   @staticmethod
   def FindDevice():
     return util.find_usbserial(constants.DEXCOM_G4_USB_VENDOR,
                                constants.DEXCOM_G4_USB_PRODUCT)
 
+  @staticmethod
+  def FindDevices():
+    return util.find_all_usbserial(constants.DEXCOM_G4_USB_VENDOR,
+                                   constants.DEXCOM_G4_USB_PRODUCT)
+
   @classmethod
   def LocateAndDownload(cls):
     device = cls.FindDevice()
@@ -48,25 +118,58 @@ class Dexcom(object):
       print 'Transmitter paired: %s' % dex.ReadTransmitterId()
       print 'Battery Status: %s (%d%%)' % (dex.ReadBatteryState(),
                                            dex.ReadBatteryLevel())
+      counts = dex.DownloadAll(
+          types=('METER_DATA', 'USER_EVENT_DATA', 'INSERTION_TIME'),
+          count_only=True)
+      egv_records = dex.ReadRecords('EGV_DATA')
       print 'Record count:'
-      print '- Meter records: %d' % (len(dex.ReadRecords('METER_DATA')))
-      print '- CGM records: %d' % (len(dex.ReadRecords('EGV_DATA')))
+      print '- Meter records: %d' % counts['METER_DATA']
+      print '- CGM records: %d' % len(egv_records)
       print ('- CGM commitable records: %d'
-             % (len([not x.display_only for x in dex.ReadRecords('EGV_DATA')])))
-      print '- Event records: %d' % (len(dex.ReadRecords('USER_EVENT_DATA')))
-      print '- Insertion records: %d' % (len(dex.ReadRecords('INSERTION_TIME')))
-
-  def __init__(self, port):
+             % len([x for x in egv_records if not x.display_only]))
+      print '- Event records: %d' % counts['USER_EVENT_DATA']
+      print '- Insertion records: %d' % counts['INSERTION_TIME']
+
+  def __init__(self, port, timeout=2.0, packet_timeout=10.0, retries=3,
+               transport=None, page_cache=None):
+    """Create a receiver connection.
+
+    Args:
+       port: serial device name.
+       timeout: (float) seconds a single serial read may block, or None to
+         block forever.
+       packet_timeout: (float) overall seconds allowed to read one packet, or
+         None for no limit.
+       retries: (int) times a command is resent after a CRC error or NAK.
+       transport: a connected transport.Transport to use instead of opening
+         the serial port.
+       page_cache: a pagecache.PageCache to serve full pages from.
+    """
     self._port_name = port
-    self._port = None
+    self._port = transport
+    self._timeout = timeout
+    self._packet_timeout = packet_timeout
+    self._retries = retries
+    self._cache = {}
+    self._page_cache = page_cache
 
   def Connect(self):
     if self._port is None:
-      self._port = serial.Serial(port=self._port_name, baudrate=115200)
+      self._port = transport.SerialTransport(self._port_name,
+                                             timeout=self._timeout)
 
   def Disconnect(self):
     if self._port is not None:
       self._port.close()
+    self.InvalidateCache()
+
+  def InvalidateCache(self, *names):
+    """Forget cached receiver values, all of them if no method names given."""
+    if names:
+      for name in names:
+        self._cache.pop(name, None)
+    else:
+      self._cache.clear()
 
   @property
   def port(self):
@@ -80,35 +183,59 @@ class Dexcom(object):
   def read(self, *args, **kwargs):
     return self.port.read(*args, **kwargs)
 
+  def readinto(self, buf):
+    return self.port.readinto(buf)
+
+  def _readfully(self, buf, deadline):
+    filled = 0
+    while filled < len(buf):
+      filled += self.readinto(buf[filled:]) or 0
+      if filled < len(buf) and deadline is not None and time.time() > deadline:
+        raise constants.TimeoutError('Timed out reading from %s'
+                                     % self._port_name)
+
   def readpacket(self, timeout=None):
-    total_read = 4
-    initial_read = self.read(total_read)
-    all_data = initial_read
-    if ord(initial_read[0]) == 1:
-      command = initial_read[3]
-      data_number = struct.unpack('<H', initial_read[1:3])[0]
-      if data_number > 6:
-        toread = abs(data_number-6)
-        second_read = self.read(toread)
-        all_data += second_read
-        total_read += toread
-        out = second_read
-      else:
-        out =  ''
-      suffix = self.read(2)
-      sent_crc = struct.unpack('<H', suffix)[0]
-      local_crc = crc16.crc16(all_data, 0, total_read)
-      if sent_crc != local_crc:
-        raise constants.CrcError("readpacket Failed CRC check")
-      num1 = total_read + 2
-      return ReadPacket(command, out)
-    else:
-      raise constants.Error('Error reading packet header!')
+    """Read one packet, skipping any garbage before the next valid header.
+
+    Args:
+       timeout: (float) overall seconds allowed, defaults to packet_timeout.
+    """
+    if timeout is None:
+      timeout = self._packet_timeout
+    deadline = None
+    if timeout is not None:
+      deadline = time.time() + timeout
+    header = bytearray(4)
+    self._readfully(memoryview(header), deadline)
+    while True:
+      sof = header.find(chr(packetwriter.PacketWriter.SOF))
+      if sof == 0:
+        # The length field counts the header and the CRC, so a packet without
+        # payload is 6 bytes.
+        packet_len = max(struct.unpack_from('<H', header, 1)[0], 6)
+        if packet_len <= packetwriter.PacketWriter.MAX_LEN:
+          break
+        sof = header.find(chr(packetwriter.PacketWriter.SOF), 1)
+      if sof < 0:
+        sof = len(header)
+      header[:len(header) - sof] = header[sof:]
+      self._readfully(memoryview(header)[len(header) - sof:], deadline)
+    packet = bytearray(packet_len)
+    packet[:4] = header
+    view = memoryview(packet)
+    self._readfully(view[4:], deadline)
+    sent_crc = struct.unpack_from('<H', packet, packet_len - 2)[0]
+    local_crc = crc16.crc16(view[:-2])
+    if sent_crc != local_crc:
+      raise constants.CrcError("readpacket Failed CRC check")
+    return ReadPacket(chr(header[3]), view[4:-2])
 
   def Ping(self):
-    self.WriteCommand(constants.PING)
-    packet = self.readpacket()
-    return ord(packet.command) == constants.ACK
+    try:
+      self.GenericReadCommand(constants.PING)
+    except constants.ReceiverError:
+      return False
+    return True
 
   def WritePacket(self, packet):
     if not packet:
@@ -124,21 +251,45 @@ class Dexcom(object):
     p.ComposePacket(command_id, *args, **kwargs)
     self.WritePacket(p.PacketString())
 
-  def GenericReadCommand(self, command_id):
-    self.WriteCommand(command_id)
-    return self.readpacket()
-
+  def GenericReadCommand(self, command_id, *args, **kwargs):
+    """Send a command and read its reply, retrying on CRC errors and NAKs.
+
+    Raises:
+       constants.ReceiverError: if the receiver replied with anything but ACK.
+    """
+    attempt = 0
+    while True:
+      try:
+        self.WriteCommand(command_id, *args, **kwargs)
+        packet = self.readpacket()
+        reply = ord(packet.command)
+        if reply == constants.NAK:
+          raise constants.NakError('Command %d was NAKed' % command_id)
+        if reply != constants.ACK:
+          raise constants.ReceiverError('Command %d failed with reply %d'
+                                        % (command_id, reply))
+        return packet
+      except (constants.CrcError, constants.NakError):
+        attempt += 1
+        if attempt > self._retries:
+          raise
+        self.clear()
+
+  @session_cached
   def ReadTransmitterId(self):
     return self.GenericReadCommand(constants.READ_TRANSMITTER_ID).data
 
+  @session_cached
   def ReadLanguage(self):
     lang = self.GenericReadCommand(constants.READ_LANGUAGE).data
     return constants.LANGUAGES[struct.unpack('H', lang)[0]]
 
+  @session_cached
   def ReadBatteryLevel(self):
     level = self.GenericReadCommand(constants.READ_BATTERY_LEVEL).data
     return struct.unpack('I', level)[0]
 
+  @session_cached
   def ReadBatteryState(self):
     state = self.GenericReadCommand(constants.READ_BATTERY_STATE).data
     return constants.BATTERY_STATES[ord(state)]
@@ -151,10 +302,12 @@ class Dexcom(object):
     rtc = self.GenericReadCommand(constants.READ_SYSTEM_TIME).data
     return util.ReceiverTimeToTime(struct.unpack('I', rtc)[0])
 
+  @session_cached
   def ReadSystemTimeOffset(self):
     rtc = self.GenericReadCommand(constants.READ_SYSTEM_TIME_OFFSET).data
     return datetime.timedelta(seconds=struct.unpack('i', rtc)[0])
 
+  @session_cached
   def ReadDisplayTimeOffset(self):
     rtc = self.GenericReadCommand(constants.READ_DISPLAY_TIME_OFFSET).data
     return datetime.timedelta(seconds=struct.unpack('i', rtc)[0])
@@ -162,81 +315,202 @@ class Dexcom(object):
   def ReadDisplayTime(self):
     return self.ReadSystemTime() + self.ReadDisplayTimeOffset()
 
+  def ToDisplayTime(self, rtimes):
+    """Convert receiver system seconds to the receiver's display time.
+
+    The display time offset is read once and cached (see CACHE_TTLS) rather
+    than per record. rtimes may be a single value, giving a datetime, or an
+    array, giving datetime64 values.
+    """
+    offset = self.ReadDisplayTimeOffset()
+    if isinstance(rtimes, numbers.Integral):
+      return util.ReceiverTimeToTime(int(rtimes)) + offset
+    return util.ReceiverTimesToDatetime64(
+        rtimes, offset.days * 86400 + offset.seconds)
+
+  @session_cached
   def ReadGlucoseUnit(self):
-    UNIT_TYPE = (None, 'mg/dL', 'mmol/L')
     gu = self.GenericReadCommand(constants.READ_GLUCOSE_UNIT).data
-    return UNIT_TYPE[ord(gu[0])]
+    return constants.GLUCOSE_UNITS[ord(gu[0])]
 
+  @session_cached
   def ReadClockMode(self):
-    CLOCK_MODE = (24, 12)
     cm = self.GenericReadCommand(constants.READ_CLOCK_MODE).data
-    return CLOCK_MODE[ord(cm[0])]
+    return constants.CLOCK_MODES[ord(cm[0])]
 
   def ReadDeviceMode(self):
     return self.GenericReadCommand(constants.READ_DEVICE_MODE).data
 
+  @session_cached
   def ReadManufacturingData(self):
-    data = self.ReadRecords('MANUFACTURING_DATA')[0].xmldata
+    data = next(self.IterRecords('MANUFACTURING_DATA')).xmldata
     return ET.fromstring(data)
 
+  def GetSerialNumber(self):
+    return self.ReadManufacturingData().get('SerialNumber')
+
   def flush(self):
     self.port.flush()
 
   def clear(self):
-    self.port.flushInput()
-    self.port.flushOutput()
+    self.port.clear()
 
+  @session_cached
   def GetFirmwareHeader(self):
     i = self.GenericReadCommand(constants.READ_FIRMWARE_HEADER)
     return ET.fromstring(i.data)
 
+  @session_cached
   def GetFirmwareSettings(self):
     i = self.GenericReadCommand(constants.READ_FIRMWARE_SETTINGS)
     return ET.fromstring(i.data)
 
+  @session_cached
   def DataPartitions(self):
     i = self.GenericReadCommand(constants.READ_DATABASE_PARTITION_INFO)
     return ET.fromstring(i.data)
 
   def ReadDatabasePageRange(self, record_type):
     record_type_index = constants.RECORD_TYPES.index(record_type)
-    self.WriteCommand(constants.READ_DATABASE_PAGE_RANGE,
-                      chr(record_type_index))
-    packet = self.readpacket()
+    packet = self.GenericReadCommand(constants.READ_DATABASE_PAGE_RANGE,
+                                     chr(record_type_index))
     return struct.unpack('II', packet.data)
 
-  def ReadDatabasePage(self, record_type, page):
-    record_type_index = constants.RECORD_TYPES.index(record_type)
-    self.WriteCommand(constants.READ_DATABASE_PAGES,
-                      (chr(record_type_index), struct.pack('I', page), chr(1)))
-    packet = self.readpacket()
-    assert ord(packet.command) == 1
-    # first index (uint), numrec (uint), record_type (byte), revision (byte),
-    # page# (uint), r1 (uint), r2 (uint), r3 (uint), ushort (Crc)
-    header_format = '<2I2c4IH'
-    header_data_len = struct.calcsize(header_format)
-    header = struct.unpack_from(header_format, packet.data)
-    header_crc = crc16.crc16(packet.data[:header_data_len-2])
-    assert header_crc == header[-1]
+  def _ParsePageHeader(self, data, record_type_index, page):
+    header_data_len = struct.calcsize(PAGE_HEADER_FORMAT)
+    header = PageHeader._make(struct.unpack_from(PAGE_HEADER_FORMAT, data))
+    header_crc = crc16.crc16(data[:header_data_len-2])
+    if header_crc != header[-1]:
+      raise constants.CrcError('Page %d header failed CRC check' % page)
     assert ord(header[2]) == record_type_index
     assert header[4] == page
-    packet_data = packet.data[header_data_len:]
+    return header, data[header_data_len:]
+
+  def _ReadPageData(self, record_type_index, start_page, page_count):
+    packet = self.GenericReadCommand(
+        constants.READ_DATABASE_PAGES,
+        (chr(record_type_index), struct.pack('I', start_page), chr(page_count)))
+    assert ord(packet.command) == 1
+    page_len, remainder = divmod(len(packet.view), page_count)
+    if remainder:
+      raise constants.Error('Read %d bytes for %d pages'
+                            % (len(packet.view), page_count))
+    return [packet.view[x * page_len:(x + 1) * page_len]
+            for x in range(page_count)]
+
+  def ReadRawDatabasePages(self, record_type, start_page, page_count=1):
+    """Read consecutive database pages with a single command.
+
+    With a page cache, full pages of fixed-size records are served from the
+    cache and only the remaining pages are read from the receiver.
+
+    Returns:
+       List of (header, page data) tuples, one per page.
+    """
+    if not 0 < page_count <= constants.MAX_DATABASE_PAGES_PER_READ:
+      raise constants.Error('Invalid page count %d' % page_count)
+    record_type_index = constants.RECORD_TYPES.index(record_type)
+    record_class = database_records.RECORD_TYPE_CLASSES.get(record_type)
+    cache = self._page_cache
+    if record_class is None:
+      cache = None
+    raw_pages = [None] * page_count
+    if cache is not None:
+      serial = self.GetSerialNumber()
+      for x in range(page_count):
+        raw_pages[x] = cache.Get(serial, record_type, start_page + x)
+    fetched = set()
+    x = 0
+    while x < page_count:
+      if raw_pages[x] is not None:
+        x += 1
+        continue
+      run_end = x + 1
+      while run_end < page_count and raw_pages[run_end] is None:
+        run_end += 1
+      raw_pages[x:run_end] = self._ReadPageData(
+          record_type_index, start_page + x, run_end - x)
+      fetched.update(range(x, run_end))
+      x = run_end
+    pages = []
+    for x, raw_page in enumerate(raw_pages):
+      header, data = self._ParsePageHeader(raw_page, record_type_index,
+                                           start_page + x)
+      if (cache is not None and x in fetched and
+          header.numrec >= len(data) // record_class._ClassSize()):
+        cache.Put(serial, record_type, start_page + x, raw_page)
+      pages.append((header, data))
+    return pages
+
+  def ReadDatabasePageHeader(self, record_type, page):
+    """Read only the header of a database page."""
+    record_type_index = constants.RECORD_TYPES.index(record_type)
+    packet = self.GenericReadCommand(
+        constants.READ_DATABASE_PAGE_HEADER,
+        (chr(record_type_index), struct.pack('I', page)))
+    return self._ParsePageHeader(packet.view, record_type_index, page)[0]
+
+  def ReadDatabasePageHeaders(self, record_type, start_page=None,
+                              end_page=None):
+    """Read the headers of a range of pages, by default every stored page.
+
+    Returns:
+       Dict of page number to PageHeader.
+    """
+    first, last = self._PageRange(record_type)
+    if start_page is not None:
+      first = max(first, start_page)
+    if end_page is not None:
+      last = min(last, end_page + 1)
+    return dict((page, self.ReadDatabasePageHeader(record_type, page))
+                for page in range(first, last))
+
+  def ChangedPages(self, record_type, previous_headers):
+    """Pages whose header differs from previous_headers, or are new.
+
+    Args:
+       record_type: one of constants.RECORD_TYPES.
+       previous_headers: dict of page number to PageHeader, as returned by
+         ReadDatabasePageHeaders at the last sync.
+
+    Returns:
+       Sorted list of page numbers.
+    """
+    headers = self.ReadDatabasePageHeaders(record_type)
+    return sorted(page for page, header in headers.items()
+                  if previous_headers.get(page) != header)
+
+  def FindPageForRecordIndex(self, record_type, index):
+    """Binary search the page headers for the page holding record index.
+
+    Returns:
+       The page number, or None if no stored page holds the record.
+    """
+    low, high = self._PageRange(record_type)
+    while low < high:
+      page = (low + high) // 2
+      header = self.ReadDatabasePageHeader(record_type, page)
+      if index < header.first_index:
+        high = page
+      elif index >= header.first_index + header.numrec:
+        low = page + 1
+      else:
+        return page
+    return None
 
-    return self.ParsePage(header, packet_data)
+  def ReadDatabasePages(self, record_type, start_page, page_count=1):
+    return [self.ParsePage(header, data) for header, data in
+            self.ReadRawDatabasePages(record_type, start_page, page_count)]
+
+  def ReadDatabasePage(self, record_type, page):
+    return self.ReadDatabasePages(record_type, page)[0]
 
   def GenericRecordYielder(self, header, data, record_type):
-    for x in range(header[1]):
-      yield record_type.Create(data, x)
+    return record_type.CreateMany(data, header[1])
 
   def ParsePage(self, header, data):
     record_type = constants.RECORD_TYPES[ord(header[2])]
-    generic_parser_map = {
-      'USER_EVENT_DATA': database_records.EventRecord,
-      'METER_DATA': database_records.MeterRecord,
-      'INSERTION_TIME': database_records.InsertionRecord,
-      'EGV_DATA': database_records.EGVRecord,
-      'SENSOR_DATA': database_records.SensorRecord,
-    }
+    generic_parser_map = database_records.RECORD_TYPE_CLASSES
     xml_parsed = ['PC_SOFTWARE_PARAMETER', 'MANUFACTURING_DATA']
     if record_type in generic_parser_map:
       return self.GenericRecordYielder(header, data,
@@ -247,16 +521,277 @@ class Dexcom(object):
       raise NotImplementedError('Parsing of %s has not yet been implemented'
                                 % record_type)
 
-  def ReadRecords(self, record_type):
-    records = []
+  def _PageRange(self, record_type):
     assert record_type in constants.RECORD_TYPES
     start, end = self.ReadDatabasePageRange(record_type)
     if start != end or not end:
       end += 1
-    for x in range(start, end):
-      records.extend(self.ReadDatabasePage(record_type, x))
+    return start, end
+
+  def IterRawPages(self, record_type, start_page=None, end_page=None,
+                   newest_first=False,
+                   pages_per_read=constants.MAX_DATABASE_PAGES_PER_READ):
+    """Yield (header, page data) for each page as it is read.
+
+    Args:
+       record_type: one of constants.RECORD_TYPES.
+       start_page: first page to read, defaults to the first page stored.
+       end_page: last page to read, defaults to the last page stored.
+       newest_first: read pages from end_page backwards.
+       pages_per_read: number of pages fetched per command.
+    """
+    if start_page is None or end_page is None:
+      first, last = self._PageRange(record_type)
+      if start_page is not None:
+        first = max(first, start_page)
+      if end_page is not None:
+        last = min(last, end_page + 1)
+    else:
+      first, last = start_page, end_page + 1
+    reads = range(first, last, pages_per_read)
+    if newest_first:
+      reads.reverse()
+    for x in reads:
+      pages = self.ReadRawDatabasePages(record_type, x,
+                                        min(pages_per_read, last - x))
+      if newest_first:
+        pages.reverse()
+      for page in pages:
+        yield page
+
+  def IterRecords(self, record_type, start_page=None, end_page=None,
+                  newest_first=False,
+                  pages_per_read=constants.MAX_DATABASE_PAGES_PER_READ):
+    """Yield records as each page is read from the receiver.
+
+    Arguments are as for IterRawPages; with newest_first the records of each
+    page are also yielded newest first.
+    """
+    for header, data in self.IterRawPages(record_type, start_page, end_page,
+                                          newest_first, pages_per_read):
+      page = self.ParsePage(header, data)
+      if newest_first:
+        page = reversed(list(page))
+      for record in page:
+        yield record
+
+  def IterRecordsPipelined(
+      self, record_type, start_page=None, end_page=None, queue_size=8,
+      pages_per_read=constants.MAX_DATABASE_PAGES_PER_READ):
+    """Like IterRecords, but reads pages ahead on a separate thread.
+
+    A reader thread keeps requesting pages while the calling thread decodes
+    and CRC checks the ones already read, so decoding overlaps serial I/O.
+    Pages are handed over in order through a queue of at most queue_size
+    pages. Do not issue other commands on this Dexcom until iteration ends.
+    """
+    pages = Queue.Queue(queue_size)
+    stop = threading.Event()
+    done = object()
+
+    def Put(item):
+      # Gives up once the consumer has stopped, so the reader never blocks
+      # on a queue nobody is draining.
+      while not stop.is_set():
+        try:
+          pages.put(item, timeout=0.1)
+          return True
+        except Queue.Full:
+          pass
+      return False
+
+    def Reader():
+      try:
+        for page in self.IterRawPages(record_type, start_page, end_page,
+                                      pages_per_read=pages_per_read):
+          if not Put(page):
+            return
+        Put(done)
+      except Exception:
+        Put(_ReaderError(sys.exc_info()))
+
+    reader = threading.Thread(target=Reader)
+    reader.daemon = True
+    reader.start()
+    try:
+      while True:
+        page = pages.get()
+        if page is done:
+          break
+        if isinstance(page, _ReaderError):
+          raise page.exc_info[0], page.exc_info[1], page.exc_info[2]
+        header, data = page
+        for record in self.ParsePage(header, data):
+          yield record
+    finally:
+      stop.set()
+      reader.join()
+
+  def ReadRecordArray(self, record_type, start_page=None, end_page=None):
+    """Read a range of pages into a numpy structured array.
+
+    Only the fixed-size record types in
+    database_records.RECORD_TYPE_CLASSES are supported.
+    """
+    record_class = database_records.RECORD_TYPE_CLASSES[record_type]
+    pages = list(self.IterRawPages(record_type, start_page, end_page))
+    return columnar.DecodePages(record_class, pages)
+
+  def ReadRecords(self, record_type,
+                  pages_per_read=constants.MAX_DATABASE_PAGES_PER_READ,
+                  pipelined=False):
+    if pipelined:
+      return list(self.IterRecordsPipelined(record_type,
+                                            pages_per_read=pages_per_read))
+    return list(self.IterRecords(record_type, pages_per_read=pages_per_read))
+
+  def ReadRecordsBetween(self, record_type, start_time, end_time):
+    """Read the records with a system time from start_time to end_time.
+
+    Pages are stored in system time order, so the first and last pages of
+    the window are found by binary search and only the pages in between are
+    read in full. Pages fetched while searching are not read again.
+    """
+    start = util.TimeToReceiverTime(start_time)
+    end = util.TimeToReceiverTime(end_time)
+    first, last = self._PageRange(record_type)
+    fetched = {}
+
+    def Page(page):
+      if page not in fetched:
+        fetched[page] = list(self.ReadDatabasePage(record_type, page))
+      return fetched[page]
+
+    # First page with a record at or after start.
+    low, high = first, last
+    while low < high:
+      page = (low + high) // 2
+      records = Page(page)
+      if records and records[-1].data[0] < start:
+        low = page + 1
+      else:
+        high = page
+    start_page = low
+    # First page whose records all come after end.
+    high = last
+    while low < high:
+      page = (low + high) // 2
+      records = Page(page)
+      if records and records[0].data[0] <= end:
+        low = page + 1
+      else:
+        high = page
+    end_page = low
+
+    results = []
+    page = start_page
+    while page < end_page:
+      if page in fetched:
+        results.extend(fetched[page])
+        page += 1
+        continue
+      run_end = page
+      while run_end + 1 < end_page and run_end + 1 not in fetched:
+        run_end += 1
+      results.extend(self.IterRecords(record_type, page, run_end))
+      page = run_end + 1
+    return [r for r in results if start <= r.data[0] <= end]
+
+  def CountRecords(self, record_type):
+    """Count the records of a partition from its first and last page headers.
+
+    Record indexes run on across pages, so two header reads are enough
+    however many pages the partition holds.
+    """
+    start, end = self._PageRange(record_type)
+    if start >= end:
+      return 0
+    first = self.ReadDatabasePageHeader(record_type, start)
+    last = first
+    if end - 1 != start:
+      last = self.ReadDatabasePageHeader(record_type, end - 1)
+    return last.first_index + last.numrec - first.first_index
+
+  def DownloadAll(self, types=None, count_only=False):
+    """Read each selected partition once.
+
+    Args:
+       types: record types to read, by default every fixed-size record type.
+       count_only: only count the records, from the first and last page
+         headers (see CountRecords), without reading any records.
+
+    Returns:
+       Dict of record type to its list of records, or to its record count.
+    """
+    if types is None:
+      types = [x for x in constants.RECORD_TYPES
+               if x in database_records.RECORD_TYPE_CLASSES]
+    results = {}
+    for record_type in types:
+      if count_only:
+        results[record_type] = self.CountRecords(record_type)
+      else:
+        results[record_type] = self.ReadRecords(record_type)
+    return results
+
+  def SyncRecords(self, record_type, checkpoints):
+    """Read only the records newer than the stored checkpoint.
+
+    Pages before the checkpointed page are skipped; the checkpointed page is
+    read again since it may have been partially filled at the last sync.
+
+    Args:
+       record_type: one of constants.RECORD_TYPES.
+       checkpoints: a sync.SyncCheckpoints, updated in place.
+
+    Returns:
+       List of records newer than the checkpoint.
+    """
+    serial = self.GetSerialNumber()
+    start, end = self._PageRange(record_type)
+    mark = checkpoints.Get(serial, record_type)
+    if mark is not None:
+      start = max(start, min(mark.page, end))
+    records = list(self.IterRecords(record_type, start, end - 1))
+    if mark is not None:
+      records = [r for r in records if r.data[0] > mark.system_seconds]
+    if records:
+      checkpoints.Set(serial, record_type, end - 1, records[-1].data[0])
     return records
 
+def main(argv=None):
+  parser = argparse.ArgumentParser(
+      description='Download data from a Dexcom G4 receiver.')
+  parser.add_argument('--export', choices=sorted(export.WRITERS),
+                      help='export records in this format instead of printing '
+                      'a summary')
+  parser.add_argument('--record-type', default='EGV_DATA',
+                      choices=sorted(database_records.RECORD_TYPE_CLASSES),
+                      help='record type to export')
+  parser.add_argument('--output', help='file to export to, default stdout')
+  parser.add_argument('--port', help='serial port of the receiver')
+  args = parser.parse_args(argv)
+  if not args.export:
+    Dexcom.LocateAndDownload()
+    return
+  device = args.port or Dexcom.FindDevice()
+  if not device:
+    sys.stderr.write('Could not find Dexcom G4 Receiver!\n')
+    sys.exit(1)
+  dex = Dexcom(device)
+  output = sys.stdout
+  if args.output:
+    output = open(args.output, 'wb')
+  try:
+    count = export.Export(
+        database_records.RECORD_TYPE_CLASSES[args.record_type],
+        dex.IterRecords(args.record_type), export.WRITERS[args.export](output))
+  finally:
+    if args.output:
+      output.close()
+    dex.Disconnect()
+  sys.stderr.write('Exported %d %s records\n' % (count, args.record_type))
+
 
 if __name__ == '__main__':
-  Dexcom.LocateAndDownload()
+  main()
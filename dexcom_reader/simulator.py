@@ -0,0 +1,256 @@
+"""A software G4 receiver for testing without hardware.
+
+SimulatedReceiver answers protocol commands from synthetic EGV, sensor,
+meter, event and insertion records stored in pages with valid CRCs. It can be
+driven in process through SimulatorTransport, or over a pseudo terminal with
+ServePty so that an unmodified readdata.Dexcom can open it as a serial port.
+"""
+import os
+import random
+import struct
+import threading
+import time
+import tty
+
+import constants
+import crc16
+import database_records
+import transport
+
+
+PAGE_DATA_LENGTH = 500
+PAGE_HEADER = struct.Struct('<2I2c4I')
+
+FIRMWARE_HEADER = ('<FirmwareHeader SchemaVersion="1" ApiVersion="2.2.0.0" '
+                   'TestApiVersion="2.3.0.0" ProductId="G4Receiver" '
+                   'ProductName="Dexcom G4 Receiver" SoftwareNumber="SW10050" '
+                   'FirmwareVersion="4.0.1.048" PortVersion="4.6.4.45" '
+                   'RFVersion="1.0.0.27" DexBootVersion="3" />')
+FIRMWARE_SETTINGS = '<FirmwareSettings FirmwareImageId="Simulated" />'
+
+
+def _Packet(command, payload=''):
+  packet = struct.pack('<BHB', 1, len(payload) + 6, command) + payload
+  return packet + struct.pack('<H', crc16.crc16(packet))
+
+
+def _Record(record_class, *values):
+  record = record_class._ClassFormat().pack(*(values + (0,)))
+  return record[:-2] + struct.pack('<H', crc16.crc16(record, 0,
+                                                       len(record) - 2))
+
+
+class SimulatedReceiver(object):
+  """A receiver holding days of synthetic data.
+
+  Args:
+     serial_number: reported in the manufacturing data.
+     days: (int) days of 5 minute EGV and sensor data to generate.
+     first_page: (int) number of the first page of each partition, as if
+       older pages had been overwritten.
+     seed: random seed for the generated glucose values.
+  """
+
+  def __init__(self, serial_number='SM00000000', days=1, first_page=0,
+               seed=0):
+    self.serial_number = serial_number
+    self.display_offset = -3600
+    self.system_time = days * 86400 + 3900
+    self._first_page = first_page
+    self._pages = {}
+    self._Generate(days, random.Random(seed))
+
+  def _Generate(self, days, rand):
+    records = dict((x, []) for x in database_records.RECORD_TYPE_CLASSES)
+    glucose = 120
+    for t in range(3600, days * 86400 + 3600, 300):
+      glucose = min(max(glucose + rand.randint(-6, 6), 40), 400)
+      trend = chr(rand.randint(1, 7))
+      records['EGV_DATA'].append(_Record(
+          database_records.EGVRecord, t, t + self.display_offset, glucose,
+          trend))
+      records['SENSOR_DATA'].append(_Record(
+          database_records.SensorRecord, t, t + self.display_offset,
+          glucose * 1000 + rand.randint(0, 999), glucose * 1000,
+          rand.randint(150, 200)))
+      if t % 43200 == 3600:
+        records['METER_DATA'].append(_Record(
+            database_records.MeterRecord, t, t + self.display_offset,
+            glucose + rand.randint(-10, 10), t))
+      if t % 21600 == 3600:
+        records['USER_EVENT_DATA'].append(_Record(
+            database_records.EventRecord, t, t + self.display_offset,
+            chr(1), chr(0), t + self.display_offset, rand.randint(10, 80)))
+      if t % (7 * 86400) == 3600:
+        records['INSERTION_TIME'].append(_Record(
+            database_records.InsertionRecord, t, t + self.display_offset,
+            t, chr(7)))
+    for record_type, type_records in records.items():
+      self._Paginate(record_type, type_records)
+    xml = ('<ManufacturingParameters SerialNumber="%s" '
+           'HardwarePartNumber="MT20649" HardwareRevision="13" '
+           'DateTimeCreated="2013-05-01 00:00:00.000" '
+           'HardwareId="{00000000-0000-0000-0000-000000000000}" />'
+           % self.serial_number)
+    self._Paginate('MANUFACTURING_DATA', [_Record(
+        database_records.GenericXMLRecord, 0, 0, xml)])
+
+  def AppendRecords(self, record_type, records):
+    """Stores records, packed with _Record, after the existing ones."""
+    record_type_index = constants.RECORD_TYPES.index(record_type)
+    size = len(records[0])
+    stored = []
+    for page in sorted(page for index, page in self._pages
+                       if index == record_type_index):
+      raw = self._pages[(record_type_index, page)]
+      numrec = PAGE_HEADER.unpack_from(raw)[1]
+      data = raw[PAGE_HEADER.size + 2:]
+      stored.extend(data[x:x + size] for x in range(0, numrec * size, size))
+    self._Paginate(record_type, stored + list(records))
+
+  def _Paginate(self, record_type, records):
+    if not records:
+      return
+    per_page = PAGE_DATA_LENGTH // len(records[0])
+    record_type_index = constants.RECORD_TYPES.index(record_type)
+    for first in range(0, len(records), per_page):
+      page_records = records[first:first + per_page]
+      page = self._first_page + first // per_page
+      header = PAGE_HEADER.pack(first, len(page_records),
+                                chr(record_type_index), chr(1), page, 0, 0, 0)
+      header += struct.pack('<H', crc16.crc16(header))
+      data = ''.join(page_records)
+      data += '\xff' * (PAGE_DATA_LENGTH - len(data))
+      self._pages[(record_type_index, page)] = header + data
+
+  def PartitionInfo(self):
+    partitions = []
+    for record_type in constants.RECORD_TYPES[:-1]:
+      record_class = database_records.RECORD_TYPE_CLASSES.get(record_type)
+      length = PAGE_DATA_LENGTH
+      if record_class is not None:
+        length = record_class._ClassSize()
+      partitions.append(
+          '<Partition Name="%s" Id="%d" RecordRevision="1" '
+          'RecordLength="%d" />'
+          % (record_type, constants.RECORD_TYPES.index(record_type), length))
+    return ('<PartitionInfo SchemaVersion="1" PageHeaderVersion="1" '
+            'PageDataLength="%d">%s</PartitionInfo>'
+            % (PAGE_DATA_LENGTH, ''.join(partitions)))
+
+  def _PageRange(self, record_type_index):
+    pages = [page for index, page in self._pages if index == record_type_index]
+    if not pages:
+      return 0xffffffff, 0xffffffff
+    return min(pages), max(pages)
+
+  def Handle(self, request):
+    """Returns the reply packet to a request packet."""
+    if not request or len(request) < 6 or ord(request[0]) != 1:
+      return _Packet(constants.INCOMPLETE_PACKET_RECEIVED)
+    command = ord(request[3])
+    payload = request[4:-2]
+    if crc16.crc16(request, 0, len(request) - 2) != struct.unpack(
+        '<H', request[-2:])[0]:
+      return _Packet(constants.NAK)
+    simple = {
+      constants.PING: '',
+      constants.READ_FIRMWARE_HEADER: FIRMWARE_HEADER,
+      constants.READ_FIRMWARE_SETTINGS: FIRMWARE_SETTINGS,
+      constants.READ_DATABASE_PARTITION_INFO: self.PartitionInfo(),
+      constants.READ_TRANSMITTER_ID: '6ABCD',
+      constants.READ_LANGUAGE: struct.pack('<H', 1033),
+      constants.READ_BATTERY_LEVEL: struct.pack('<I', 85),
+      constants.READ_BATTERY_STATE: chr(2),
+      constants.READ_RTC: struct.pack('<I', self.system_time),
+      constants.READ_SYSTEM_TIME: struct.pack('<I', self.system_time),
+      constants.READ_SYSTEM_TIME_OFFSET: struct.pack('<i', 0),
+      constants.READ_DISPLAY_TIME_OFFSET: struct.pack('<i',
+                                                      self.display_offset),
+      constants.READ_GLUCOSE_UNIT: chr(1),
+      constants.READ_CLOCK_MODE: chr(0),
+      constants.READ_DEVICE_MODE: chr(0),
+    }
+    if command in simple:
+      return _Packet(constants.ACK, simple[command])
+    try:
+      if command == constants.READ_DATABASE_PAGE_RANGE:
+        return _Packet(constants.ACK,
+                       struct.pack('<II', *self._PageRange(ord(payload[0]))))
+      if command == constants.READ_DATABASE_PAGES:
+        record_type_index, page, count = struct.unpack('<BIB', payload)
+        return _Packet(constants.ACK, ''.join(
+            self._pages[(record_type_index, x)]
+            for x in range(page, page + count)))
+      if command == constants.READ_DATABASE_PAGE_HEADER:
+        record_type_index, page = struct.unpack('<BI', payload)
+        return _Packet(constants.ACK,
+                       self._pages[(record_type_index, page)][:28])
+    except (KeyError, IndexError, struct.error):
+      return _Packet(constants.INVALID_PARAM)
+    return _Packet(constants.INVALID_COMMAND)
+
+
+class SimulatorTransport(transport.MemoryTransport):
+  """An in-process connection to a SimulatedReceiver.
+
+  Args:
+     receiver: the SimulatedReceiver.
+     latency: (float) seconds each command takes to answer.
+     error_rate: (float) probability that a reply is corrupted on the wire.
+     seed: random seed for the injected errors.
+  """
+
+  def __init__(self, receiver, latency=0, error_rate=0, seed=0):
+    transport.MemoryTransport.__init__(self, self._Handle)
+    self._receiver = receiver
+    self._latency = latency
+    self._error_rate = error_rate
+    self._random = random.Random(seed)
+
+  def _Handle(self, request):
+    if self._latency:
+      time.sleep(self._latency)
+    reply = self._receiver.Handle(request)
+    if self._error_rate and self._random.random() < self._error_rate:
+      position = self._random.randrange(4, len(reply))
+      reply = (reply[:position] + chr(ord(reply[position]) ^ 0xff) +
+               reply[position + 1:])
+    return reply
+
+
+def _ReadFully(fd, size):
+  data = ''
+  while len(data) < size:
+    chunk = os.read(fd, size - len(data))
+    if not chunk:
+      raise EOFError
+    data += chunk
+  return data
+
+
+def ServePty(receiver, latency=0):
+  """Serves receiver on a new pseudo terminal from a daemon thread.
+
+  Returns:
+     The device name of the terminal, to pass to readdata.Dexcom.
+  """
+  master, slave = os.openpty()
+  tty.setraw(slave)
+
+  def Serve():
+    try:
+      while True:
+        header = _ReadFully(master, 4)
+        length = max(struct.unpack('<H', header[1:3])[0], 6)
+        request = header + _ReadFully(master, length - 4)
+        if latency:
+          time.sleep(latency)
+        os.write(master, receiver.Handle(request))
+    except (EOFError, OSError):
+      os.close(master)
+
+  thread = threading.Thread(target=Serve)
+  thread.daemon = True
+  thread.start()
+  return os.ttyname(slave)
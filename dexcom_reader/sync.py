@@ -0,0 +1,59 @@
+import collections
+import json
+import os
+
+import constants
+
+
+Checkpoint = collections.namedtuple('Checkpoint', ['page', 'system_seconds'])
+
+
+class SyncCheckpoints(object):
+  """High-water marks of the records already read from each receiver.
+
+  A mark is kept per receiver serial number and record type, holding the last
+  page read and the system time (receiver seconds) of the newest record seen.
+
+  Args:
+     path: JSON file the marks are loaded from and saved to. Without one the
+       marks are only kept in memory and cannot be saved.
+  """
+
+  def __init__(self, path=None):
+    self._path = path
+    self._marks = {}
+    if path is not None and os.path.exists(path):
+      self.Load()
+
+  def _Path(self):
+    if self._path is None:
+      raise constants.Error('SyncCheckpoints has no file to load or save')
+    return self._path
+
+  def Load(self):
+    with open(self._Path()) as f:
+      marks = json.load(f)
+    self._marks = dict(
+        (serial, dict((record_type, Checkpoint(*mark))
+                      for record_type, mark in types.items()))
+        for serial, types in marks.items())
+
+  def Save(self):
+    path = self._Path()
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+      json.dump(self._marks, f, indent=2, sort_keys=True)
+    os.rename(tmp_path, path)
+
+  def Get(self, serial, record_type):
+    return self._marks.get(serial, {}).get(record_type)
+
+  def Set(self, serial, record_type, page, system_seconds):
+    self._marks.setdefault(serial, {})[record_type] = Checkpoint(
+        page, system_seconds)
+
+  def Clear(self, serial=None):
+    if serial is None:
+      self._marks.clear()
+    else:
+      self._marks.pop(serial, None)
@@ -0,0 +1,126 @@
+"""A client running Dexcom commands on a worker thread per receiver.
+
+Each ThreadedDexcom owns one receiver connection and a thread that executes
+its commands in the order they were submitted. Commands return a Future right
+away, so a single caller can drive many receivers at once, at the cost of one
+thread per receiver.
+"""
+import inspect
+import Queue
+import threading
+
+import constants
+import readdata
+
+
+def _Commands(dexcom_class):
+  """The public, non-generator methods of dexcom_class."""
+  commands = set()
+  for cls in inspect.getmro(dexcom_class):
+    for name, value in vars(cls).items():
+      if (name[:1].isupper() and inspect.isfunction(value) and
+          not inspect.isgeneratorfunction(value)):
+        commands.add(name)
+  return frozenset(commands)
+
+
+# Dexcom methods that can be submitted. Iter* generators are left out, since
+# iterating them would do I/O on the caller's thread.
+COMMANDS = _Commands(readdata.Dexcom)
+
+# Queued to stop the worker thread.
+_STOP = object()
+
+
+class Future(object):
+  """The pending result of a command."""
+
+  def __init__(self):
+    self._done = threading.Event()
+    self._lock = threading.Lock()
+    self._result = None
+    self._exception = None
+    self._callbacks = []
+
+  def done(self):
+    return self._done.is_set()
+
+  def result(self, timeout=None):
+    """Waits for and returns the result, raising the command's exception."""
+    if not self._done.wait(timeout):
+      raise constants.TimeoutError('Command did not complete')
+    if self._exception is not None:
+      raise self._exception
+    return self._result
+
+  def exception(self, timeout=None):
+    if not self._done.wait(timeout):
+      raise constants.TimeoutError('Command did not complete')
+    return self._exception
+
+  def add_done_callback(self, callback):
+    """Calls callback(future) once done, from the worker thread."""
+    with self._lock:
+      if not self._done.is_set():
+        self._callbacks.append(callback)
+        return
+    callback(self)
+
+  def _Finish(self, result, exception):
+    with self._lock:
+      self._result = result
+      self._exception = exception
+      self._done.set()
+      callbacks, self._callbacks = self._callbacks, []
+    for callback in callbacks:
+      callback(self)
+
+
+class ThreadedDexcom(object):
+  """Wraps a readdata.Dexcom so that its commands return Futures.
+
+  Args:
+     dexcom: a readdata.Dexcom, or a port name to open one on.
+  """
+
+  def __init__(self, dexcom, **kwargs):
+    if not isinstance(dexcom, readdata.Dexcom):
+      dexcom = readdata.Dexcom(dexcom, **kwargs)
+    self._dexcom = dexcom
+    self._commands = Queue.Queue()
+    self._thread = threading.Thread(target=self._Run)
+    self._thread.daemon = True
+    self._thread.start()
+
+  def _Run(self):
+    while True:
+      item = self._commands.get()
+      if item is _STOP:
+        return
+      future, name, args, kwargs = item
+      try:
+        result = getattr(self._dexcom, name)(*args, **kwargs)
+      except Exception as e:
+        future._Finish(None, e)
+      else:
+        future._Finish(result, None)
+
+  def Submit(self, name, *args, **kwargs):
+    """Queues the Dexcom method name and returns a Future of its result."""
+    future = Future()
+    self._commands.put((future, name, args, kwargs))
+    return future
+
+  def __getattr__(self, name):
+    if name not in COMMANDS:
+      raise AttributeError(name)
+    def command(*args, **kwargs):
+      return self.Submit(name, *args, **kwargs)
+    command.__name__ = name
+    return command
+
+  def Close(self):
+    """Finishes the queued commands and disconnects."""
+    self._commands.put(_STOP)
+    self._thread.join()
+    self._dexcom.Disconnect()
@@ -0,0 +1,91 @@
+"""Byte transports the Dexcom client talks to the receiver through.
+
+A transport only moves bytes; packet framing, CRCs and retries are handled by
+readdata.Dexcom. Anything implementing the Transport methods can be used, for
+example the in-memory MemoryTransport in tests.
+"""
+import serial
+
+
+class Transport(object):
+  """Interface of a receiver connection."""
+
+  def read(self, size):
+    """Reads up to size bytes, returning fewer if the read timed out."""
+    raise NotImplementedError
+
+  def readinto(self, buf):
+    """Reads into the writable buffer buf, returning the bytes read."""
+    data = self.read(len(buf))
+    buf[:len(data)] = data
+    return len(data)
+
+  def write(self, data):
+    raise NotImplementedError
+
+  def flush(self):
+    """Waits until written data has been sent."""
+
+  def clear(self):
+    """Discards any unread input and unsent output."""
+
+  def close(self):
+    pass
+
+
+class SerialTransport(Transport):
+  """A receiver attached to a local serial port."""
+
+  def __init__(self, port_name, baudrate=115200, timeout=None):
+    self._serial = serial.Serial(port=port_name, baudrate=baudrate,
+                                 timeout=timeout)
+
+  def read(self, size):
+    return self._serial.read(size)
+
+  def readinto(self, buf):
+    return self._serial.readinto(buf)
+
+  def write(self, data):
+    return self._serial.write(data)
+
+  def flush(self):
+    self._serial.flush()
+
+  def clear(self):
+    self._serial.flushInput()
+    self._serial.flushOutput()
+
+  def close(self):
+    self._serial.close()
+
+
+class MemoryTransport(Transport):
+  """An in-memory transport answering each write by calling a handler.
+
+  Args:
+     handler: callable given each packet written, as a string, and returning
+       the bytes the receiver replies with.
+  """
+
+  def __init__(self, handler):
+    self._handler = handler
+    self._buffer = bytearray()
+
+  def read(self, size):
+    data = str(self._buffer[:size])
+    del self._buffer[:size]
+    return data
+
+  def readinto(self, buf):
+    size = min(len(buf), len(self._buffer))
+    buf[:size] = self._buffer[:size]
+    del self._buffer[:size]
+    return size
+
+  def write(self, data):
+    self._buffer.extend(self._handler(str(data)))
+    return len(data)
+
+  def clear(self):
+    del self._buffer[:]
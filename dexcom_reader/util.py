@@ -1,3 +1,4 @@
+import calendar
 import constants
 import datetime
 import os
@@ -6,12 +7,49 @@ import plistlib
 import re
 import subprocess
 
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+
+# constants.BASE_TIME as seconds since the Unix epoch, and as a datetime64.
+BASE_EPOCH = calendar.timegm(constants.BASE_TIME.timetuple())
+if numpy is not None:
+  BASE_DATETIME64 = numpy.datetime64(constants.BASE_TIME, 's')
+
 
 def ReceiverTimeToTime(rtime):
   return constants.BASE_TIME + datetime.timedelta(seconds=rtime)
 
 
+def ReceiverTimesToDatetime64(rtimes, offset=0):
+  """Converts an array of receiver seconds to datetime64[s] in one call.
+
+  Args:
+     rtimes: array or sequence of receiver seconds.
+     offset: (int) seconds to add, e.g. the display time offset.
+  """
+  rtimes = numpy.asarray(rtimes, dtype=numpy.int64)
+  return BASE_DATETIME64 + (rtimes + offset).astype('timedelta64[s]')
+
+
+def ReceiverTimesToEpoch(rtimes, offset=0):
+  """Converts an array of receiver seconds to Unix epoch seconds."""
+  return numpy.asarray(rtimes, dtype=numpy.int64) + (BASE_EPOCH + offset)
+
+
+def TimeToReceiverTime(t):
+  delta = t - constants.BASE_TIME
+  return delta.days * 86400 + delta.seconds
+
+
 def linux_find_usbserial(vendor, product):
+  for device in linux_find_all_usbserial(vendor, product):
+    return device
+
+
+def linux_find_all_usbserial(vendor, product):
   DEV_REGEX = re.compile('^tty(USB|ACM)[0-9]+$')
   for usb_dev_root in os.listdir('/sys/bus/usb/devices'):
     device_name = os.path.join('/sys/bus/usb/devices', usb_dev_root)
@@ -26,10 +64,15 @@ def linux_find_usbserial(vendor, product):
     for root, dirs, files in os.walk(device_name):
       for option in dirs + files:
         if DEV_REGEX.match(option):
-          return os.path.join('/dev', option)
+          yield os.path.join('/dev', option)
 
 
 def osx_find_usbserial(vendor, product):
+  for device in osx_find_all_usbserial(vendor, product):
+    return device
+
+
+def osx_find_all_usbserial(vendor, product):
   def recur(v):
     if hasattr(v, '__iter__') and 'idVendor' in v and 'idProduct' in v:
       if v['idVendor'] == vendor and v['idProduct'] == product:
@@ -38,20 +81,19 @@ def osx_find_usbserial(vendor, product):
           if 'IODialinDevice' not in tmp and 'IORegistryEntryChildren' in tmp:
             tmp = tmp['IORegistryEntryChildren']
           elif 'IODialinDevice' in tmp:
-            return tmp['IODialinDevice']
+            yield tmp['IODialinDevice']
+            return
           else:
             break
 
     if type(v) == list:
       for x in v:
-        out = recur(x)
-        if out is not None:
-          return out
+        for out in recur(x):
+          yield out
     elif type(v) == dict or issubclass(type(v), dict):
       for x in v.values():
-        out = recur(x)
-        if out is not None:
-          return out
+        for out in recur(x):
+          yield out
 
   sp = subprocess.Popen(['/usr/sbin/ioreg', '-k', 'IODialinDevice',
                          '-r', '-t', '-l', '-a', '-x'],
@@ -80,3 +122,24 @@ def find_usbserial(vendor, product):
   else:
     raise NotImplementedError('Cannot find serial ports on %s'
                               % platform.system())
+
+
+def find_all_usbserial(vendor, product):
+  """Find the tty devices of every attached usbserial device with the given
+  identifiers.
+
+  Args:
+     vendor: (int) something like 0x0000
+     product: (int) something like 0x0000
+
+  Returns:
+     List of strings, like ['/dev/ttyACM0', '/dev/ttyACM1']
+  """
+  if platform.system() == 'Linux':
+    vendor, product = [('%04x' % (x)).strip() for x in (vendor, product)]
+    return list(linux_find_all_usbserial(vendor, product))
+  elif platform.system() == 'Darwin':
+    return list(osx_find_all_usbserial(vendor, product))
+  else:
+    raise NotImplementedError('Cannot find serial ports on %s'
+                              % platform.system())
@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from dexcom_reader import bulkdecode
+from dexcom_reader import capture
+from dexcom_reader import constants
+from dexcom_reader import database_records
+from dexcom_reader import readdata
+from dexcom_reader import simulator
+
+
+class DecodeTest(unittest.TestCase):
+
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.root)
+
+  def _PageFile(self, name, receiver, record_type, pages):
+    index = constants.RECORD_TYPES.index(record_type)
+    path = os.path.join(self.root, name)
+    with open(path, 'wb') as f:
+      for page in pages:
+        f.write(receiver._pages[(index, page)])
+    return bulkdecode.PageFileTask('SM1', path, os.path.getsize(path))
+
+  def testDeduplicateKeepsDistinctRecordsWithSameSystemTime(self):
+    receiver = simulator.SimulatedReceiver()
+    events = [
+      simulator._Record(database_records.EventRecord, 3600, 0, chr(1),
+                        chr(0), 3600, 40),
+      simulator._Record(database_records.EventRecord, 3600, 0, chr(2),
+                        chr(1), 3600, 250),
+      simulator._Record(database_records.EventRecord, 3900, 300, chr(4),
+                        chr(3), 3900, 15),
+    ]
+    receiver._Paginate('USER_EVENT_DATA', events)
+    # Two overlapping downloads of the same page.
+    tasks = [self._PageFile(name, receiver, 'USER_EVENT_DATA', [0])
+             for name in ('a', 'b')]
+    merged = bulkdecode.Decode(tasks, processes=1)
+    records = merged[('SM1', 'USER_EVENT_DATA')]
+    self.assertEqual(records.tobytes(), ''.join(events))
+    merged = bulkdecode.Decode(tasks, processes=1, deduplicate=False)
+    self.assertEqual(len(merged[('SM1', 'USER_EVENT_DATA')]), 6)
+
+  def testCaptureWithErrorReply(self):
+    path = os.path.join(self.root, 'capture')
+    dex = readdata.Dexcom('sim', transport=simulator.SimulatorTransport(
+        simulator.SimulatedReceiver(serial_number='SM1')))
+    capture.StartCapture(dex, path)
+    records = dex.ReadRecords('EGV_DATA')
+    try:
+      dex.ReadDatabasePage('EGV_DATA', 999)
+    except constants.Error:
+      pass
+    dex.Disconnect()
+    merged = bulkdecode.DecodeCaptures([path], processes=1)
+    self.assertEqual(merged[('SM1', 'EGV_DATA')].tobytes(),
+                     ''.join(r.raw_data.tobytes() for r in records))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,34 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from dexcom_reader import capture
+from dexcom_reader import readdata
+from dexcom_reader import simulator
+
+
+class CaptureTest(unittest.TestCase):
+
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+    self.path = os.path.join(self.root, 'capture')
+
+  def tearDown(self):
+    shutil.rmtree(self.root)
+
+  def testReplayAfterCachedSerialNumber(self):
+    dex = readdata.Dexcom('sim', transport=simulator.SimulatorTransport(
+        simulator.SimulatedReceiver(serial_number='SM12345678')))
+    dex.GetSerialNumber()
+    writer = capture.StartCapture(dex, self.path)
+    egvs = [r.raw_data for r in dex.ReadRecords('EGV_DATA')]
+    dex.Disconnect()
+    replay = capture.ReplayDexcom(self.path)
+    self.assertEqual(replay.GetSerialNumber(), 'SM12345678')
+    self.assertEqual([r.raw_data for r in replay.ReadRecords('EGV_DATA')],
+                     egvs)
+
+
+if __name__ == '__main__':
+  unittest.main()
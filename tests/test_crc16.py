@@ -0,0 +1,49 @@
+import random
+import struct
+import unittest
+
+from dexcom_reader import crc16
+
+
+class Crc16Test(unittest.TestCase):
+
+  def setUp(self):
+    rand = random.Random(0)
+    self.data = ''.join(chr(rand.randint(0, 255)) for _ in range(600))
+
+  def testKnownValue(self):
+    # CRC-16/XMODEM check value.
+    self.assertEqual(crc16.crc16('123456789'), 0x31c3)
+    self.assertEqual(crc16.crc16_slow('123456789'), 0x31c3)
+
+  def testMatchesTable(self):
+    for buf in (self.data, bytearray(self.data), memoryview(self.data)):
+      for start, end in ((None, None), (0, 600), (5, 17), (100, 101),
+                         (None, 300), (299, None), (42, 42)):
+        self.assertEqual(crc16.crc16(buf, start, end),
+                         crc16.crc16_slow(buf, start, end),
+                         (type(buf), start, end))
+
+  def testRecords(self):
+    size = 13
+    records = ''
+    for x in range(40):
+      body = self.data[x * size:x * size + size - 2]
+      crc = crc16.crc16_slow(body)
+      if x % 7 == 3:
+        crc ^= 1
+      records += body + struct.pack('<H', crc)
+    buf = 'xyz' + records
+    expected = [x % 7 != 3 for x in range(40)]
+    for use_numpy in (False, True):
+      computed, stored = crc16.crc16_records(buf, size, 40, offset=3,
+                                             use_numpy=use_numpy)
+      self.assertEqual(computed,
+                       [crc16.crc16_slow(records, x, x + size - 2)
+                        for x in range(0, 40 * size, size)])
+      self.assertEqual(crc16.check_records(buf, size, 40, 3, use_numpy),
+                       expected)
+
+
+if __name__ == '__main__':
+  unittest.main()
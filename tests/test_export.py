@@ -0,0 +1,82 @@
+import json
+import StringIO
+import unittest
+
+from dexcom_reader import constants
+from dexcom_reader import database_records
+from dexcom_reader import export
+from dexcom_reader import simulator
+from dexcom_reader import util
+
+
+def _Records(record_class, rows):
+  data = ''.join(simulator._Record(record_class, *row) for row in rows)
+  return list(record_class.CreateMany(data, len(rows)))
+
+
+RECORDS = {
+  database_records.EGVRecord: [
+    (3600, 0, 120, chr(1)),
+    (3900, 300, 250 | constants.EGV_DISPLAY_ONLY_MASK, chr(0x14)),
+    (4200, 600, 5, chr(9)),
+  ],
+  database_records.SensorRecord: [
+    (3600, 0, 120500, 120000, 170),
+  ],
+  database_records.MeterRecord: [
+    (3600, 0, 110, 3500),
+  ],
+  database_records.EventRecord: [
+    (3600, 0, chr(1), chr(0), 3000, 40),
+    (3600, 0, chr(2), chr(1), 3100, 250),
+    (3700, 100, chr(3), chr(2), 3200, 1),
+    (3800, 200, chr(4), chr(3), 3300, 15),
+  ],
+  database_records.InsertionRecord: [
+    (3600, 0, 3600, chr(1)),
+    (3900, 300, 3600, chr(7)),
+  ],
+}
+
+
+def _Expected(record, name):
+  if name == 'record_display_time':
+    value = util.ReceiverTimeToTime(record.data[1])
+  else:
+    value = getattr(record, name)
+  if hasattr(value, 'isoformat'):
+    value = value.isoformat()
+  return value
+
+
+class ExportTest(unittest.TestCase):
+
+  def testRowsMatchRecordProperties(self):
+    for record_class, rows in RECORDS.items():
+      records = _Records(record_class, rows)
+      f = StringIO.StringIO()
+      export.Export(record_class, records, export.JsonLinesWriter(f))
+      lines = f.getvalue().splitlines()
+      self.assertEqual(len(lines), len(records))
+      for record, line in zip(records, lines):
+        for name, value in json.loads(line).items():
+          self.assertEqual(value, _Expected(record, name),
+                           '%s.%s' % (record_class.__name__, name))
+
+  def testInsulinScaledInEveryFormat(self):
+    records = _Records(database_records.EventRecord,
+                       RECORDS[database_records.EventRecord])
+    self.assertEqual(records[1].event_value, 2.5)
+    f = StringIO.StringIO()
+    export.Export(database_records.EventRecord, records, export.CsvWriter(f))
+    self.assertEqual(f.getvalue().splitlines()[2].split(',')[-1], '2.5')
+    f = StringIO.StringIO()
+    export.Export(database_records.EventRecord, records,
+                  export.ColumnarWriter(f))
+    f.seek(0)
+    columns = list(export.ReadColumnar(f))[0]
+    self.assertEqual(columns['event_value'].tolist(), [40, 2.5, 1, 15])
+
+
+if __name__ == '__main__':
+  unittest.main()
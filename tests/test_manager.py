@@ -0,0 +1,49 @@
+import threading
+import unittest
+
+from dexcom_reader import manager
+from dexcom_reader import readdata
+from dexcom_reader import simulator
+
+
+class SimulatedDexcom(readdata.Dexcom):
+  """Opens ports named after simulated receivers' serial numbers."""
+  disconnected = []
+
+  def __init__(self, port):
+    readdata.Dexcom.__init__(
+        self, port, transport=simulator.SimulatorTransport(
+            simulator.SimulatedReceiver(serial_number=port, days=2)))
+
+  def Disconnect(self):
+    readdata.Dexcom.Disconnect(self)
+    self.disconnected.append(self._port_name)
+
+
+class DownloadManagerTest(unittest.TestCase):
+
+  def setUp(self):
+    SimulatedDexcom.disconnected = []
+
+  def testDownloadsEveryPort(self):
+    counts = {}
+    def Sink(serial, record_type, records):
+      counts[serial] = counts.get(serial, 0) + len(records)
+    status = manager.DownloadManager(
+        Sink, ('EGV_DATA',), dexcom_class=SimulatedDexcom).Run(
+            'SM%d' % x for x in range(3))
+    self.assertEqual(status, {'SM0': 'SM0', 'SM1': 'SM1', 'SM2': 'SM2'})
+    self.assertEqual(counts, {'SM0': 576, 'SM1': 576, 'SM2': 576})
+
+  def testSinkErrorStopsWorkers(self):
+    def Sink(serial, record_type, records):
+      raise ValueError('disk full')
+    download = manager.DownloadManager(Sink, queue_size=1, max_workers=2,
+                                       dexcom_class=SimulatedDexcom)
+    self.assertRaises(ValueError, download.Run, ['SM0', 'SM1', 'SM2'])
+    self.assertEqual(threading.active_count(), 1)
+    self.assertEqual(sorted(SimulatedDexcom.disconnected), ['SM0', 'SM1'])
+
+
+if __name__ == '__main__':
+  unittest.main()
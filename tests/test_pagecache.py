@@ -0,0 +1,57 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from dexcom_reader import pagecache
+from dexcom_reader import readdata
+from dexcom_reader import simulator
+
+
+class PageCacheTest(unittest.TestCase):
+
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.root)
+
+  def testPutGet(self):
+    cache = pagecache.PageCache(self.root)
+    self.assertEqual(cache.Get('SM1', 'EGV_DATA', 3), None)
+    cache.Put('SM1', 'EGV_DATA', 3, 'a' * 528)
+    cache.Put('SM1', 'EGV_DATA', 3, 'b' * 528)
+    self.assertEqual(cache.Get('SM1', 'EGV_DATA', 3), 'b' * 528)
+    self.assertEqual(cache.size, 528)
+    self.assertTrue(os.path.isfile(
+        os.path.join(self.root, 'SM1', 'EGV_DATA', '3.page')))
+    reopened = pagecache.PageCache(self.root)
+    self.assertEqual(reopened.size, 528)
+    self.assertEqual(reopened.Get('SM1', 'EGV_DATA', 3), 'b' * 528)
+
+  def testEvictsLeastRecentlyUsed(self):
+    cache = pagecache.PageCache(self.root, max_bytes=3 * 528)
+    for page in range(3):
+      cache.Put('SM1', 'EGV_DATA', page, 'x' * 528)
+    cache.Get('SM1', 'EGV_DATA', 0)
+    cache.Put('SM1', 'EGV_DATA', 3, 'x' * 528)
+    self.assertEqual(cache.size, 3 * 528)
+    self.assertEqual(cache.Get('SM1', 'EGV_DATA', 1), None)
+    for page in (0, 2, 3):
+      self.assertNotEqual(cache.Get('SM1', 'EGV_DATA', page), None)
+
+  def testServesFullPages(self):
+    receiver = simulator.SimulatedReceiver(days=1)
+    cache = pagecache.PageCache(self.root)
+    dex = readdata.Dexcom('sim', transport=simulator.SimulatorTransport(
+        receiver), page_cache=cache)
+    records = [r.raw_data for r in dex.ReadRecords('EGV_DATA')]
+    self.assertTrue(cache.size)
+    dex = readdata.Dexcom('sim', transport=simulator.SimulatorTransport(
+        receiver), page_cache=pagecache.PageCache(self.root))
+    self.assertEqual([r.raw_data for r in dex.ReadRecords('EGV_DATA')],
+                     records)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,241 @@
+import math
+import struct
+import threading
+import time
+import unittest
+
+from dexcom_reader import constants
+from dexcom_reader import database_records
+from dexcom_reader import readdata
+from dexcom_reader import simulator
+from dexcom_reader import transport
+from dexcom_reader import util
+
+
+class FailingTransport(simulator.SimulatorTransport):
+  """Fails every request after the first few."""
+
+  def __init__(self, receiver, requests):
+    simulator.SimulatorTransport.__init__(self, receiver)
+    self._requests = requests
+
+  def _Handle(self, request):
+    if self._requests <= 0:
+      raise IOError('unplugged')
+    self._requests -= 1
+    return simulator.SimulatorTransport._Handle(self, request)
+
+
+class GarbageTransport(simulator.SimulatorTransport):
+  """Prefixes every reply with bytes that are not a packet."""
+
+  def __init__(self, receiver, garbage):
+    simulator.SimulatorTransport.__init__(self, receiver)
+    self._garbage = garbage
+
+  def _Handle(self, request):
+    return self._garbage + simulator.SimulatorTransport._Handle(self, request)
+
+
+class CannedTransport(transport.MemoryTransport):
+  """Answers every request with the same reply."""
+
+  def __init__(self, reply):
+    transport.MemoryTransport.__init__(self, self._Handle)
+    self.requests = 0
+    self._reply = reply
+
+  def _Handle(self, request):
+    self.requests += 1
+    return self._reply
+
+
+class GenericReadCommandTest(unittest.TestCase):
+
+  def setUp(self):
+    self.receiver = simulator.SimulatedReceiver(serial_number='SM12345678')
+
+  def testResyncAfterGarbage(self):
+    for garbage in ('\x00\xff', '\x01\xff\xff', 'garbage\x01'):
+      dex = readdata.Dexcom('sim', transport=GarbageTransport(self.receiver,
+                                                              garbage))
+      self.assertEqual(dex.GetSerialNumber(), 'SM12345678')
+      self.assertEqual(len(dex.ReadRecords('EGV_DATA')), 288)
+
+  def testRetriesCorruptReplies(self):
+    dex = readdata.Dexcom('sim', retries=10,
+                          transport=simulator.SimulatorTransport(
+                              self.receiver, error_rate=0.3, seed=1))
+    self.assertEqual(
+        [r.raw_data for r in dex.ReadRecords('EGV_DATA')],
+        [r.raw_data for r in readdata.Dexcom(
+            'sim', transport=simulator.SimulatorTransport(
+                self.receiver)).ReadRecords('EGV_DATA')])
+
+  def testCrcRetriesExhausted(self):
+    reply = simulator._Packet(constants.ACK, 'abc')
+    reply = reply[:-1] + chr(ord(reply[-1]) ^ 0xff)
+    canned = CannedTransport(reply)
+    dex = readdata.Dexcom('sim', retries=2, transport=canned)
+    self.assertRaises(constants.CrcError, dex.Ping)
+    self.assertEqual(canned.requests, 3)
+
+  def testNakRetriesExhausted(self):
+    canned = CannedTransport(simulator._Packet(constants.NAK))
+    dex = readdata.Dexcom('sim', retries=2, transport=canned)
+    self.assertRaises(constants.NakError, dex.ReadTransmitterId)
+    self.assertEqual(canned.requests, 3)
+
+  def testErrorReplies(self):
+    for reply in (constants.INVALID_COMMAND, constants.INVALID_PARAM,
+                  constants.INCOMPLETE_PACKET_RECEIVED,
+                  constants.RECEIVER_ERROR, constants.INVALID_MODE):
+      canned = CannedTransport(simulator._Packet(reply))
+      dex = readdata.Dexcom('sim', transport=canned)
+      self.assertRaises(constants.ReceiverError, dex.ReadBatteryLevel)
+      self.assertEqual(canned.requests, 1)
+    dex = readdata.Dexcom('sim', transport=simulator.SimulatorTransport(
+        self.receiver))
+    self.assertRaises(constants.ReceiverError, dex.ReadDatabasePage,
+                      'EGV_DATA', 999)
+
+  def testPacketTimeout(self):
+    dex = readdata.Dexcom('sim', packet_timeout=0.2,
+                          transport=CannedTransport('\x01\x10'))
+    start = time.time()
+    self.assertRaises(constants.TimeoutError, dex.ReadTransmitterId)
+    self.assertLess(time.time() - start, 2)
+
+
+class IterRecordsPipelinedTest(unittest.TestCase):
+
+  def setUp(self):
+    self.receiver = simulator.SimulatedReceiver(days=1)
+
+  def _Dexcom(self, transport=None):
+    return readdata.Dexcom(
+        'sim', retries=0, transport=transport or simulator.SimulatorTransport(
+            self.receiver))
+
+  def _Finishes(self, func):
+    thread = threading.Thread(target=func)
+    thread.daemon = True
+    thread.start()
+    thread.join(10)
+    return not thread.is_alive()
+
+  def testMatchesIterRecords(self):
+    dex = self._Dexcom()
+    self.assertEqual(
+        [r.raw_data for r in dex.IterRecordsPipelined('EGV_DATA')],
+        [r.raw_data for r in dex.IterRecords('EGV_DATA')])
+
+  def testCloseWithFullQueue(self):
+    it = self._Dexcom().IterRecordsPipelined('EGV_DATA', queue_size=7,
+                                             pages_per_read=1)
+    next(it)
+    # Let the reader fill the queue with the remaining pages.
+    time.sleep(0.5)
+    self.assertTrue(self._Finishes(it.close))
+
+  def testReaderErrorIsRaised(self):
+    dex = self._Dexcom(FailingTransport(self.receiver, 3))
+    self.assertRaises(IOError, list,
+                      dex.IterRecordsPipelined('EGV_DATA', pages_per_read=1))
+
+
+
+class CountingTransport(simulator.SimulatorTransport):
+
+  def __init__(self, receiver):
+    simulator.SimulatorTransport.__init__(self, receiver)
+    self.commands = []
+
+  def _Handle(self, request):
+    self.commands.append(ord(request[3]))
+    return simulator.SimulatorTransport._Handle(self, request)
+
+
+class DownloadAllTest(unittest.TestCase):
+
+  def testCountOnlyReadsHeaders(self):
+    receiver = simulator.SimulatedReceiver(days=8)
+    dex = readdata.Dexcom('sim', transport=simulator.SimulatorTransport(
+        receiver))
+    records = dex.DownloadAll()
+    transport = CountingTransport(receiver)
+    dex = readdata.Dexcom('sim', transport=transport)
+    counts = dex.DownloadAll(count_only=True)
+    self.assertEqual(counts, dict((record_type, len(type_records))
+                                  for record_type, type_records
+                                  in records.items()))
+    self.assertNotIn(constants.READ_DATABASE_PAGES, transport.commands)
+
+
+
+class PageCountingTransport(simulator.SimulatorTransport):
+  """Records the number of every page read in full."""
+
+  def __init__(self, receiver):
+    simulator.SimulatorTransport.__init__(self, receiver)
+    self.pages = []
+
+  def _Handle(self, request):
+    if ord(request[3]) == constants.READ_DATABASE_PAGES:
+      _, page, count = struct.unpack_from('<BIB', request, 4)
+      self.pages.extend(range(page, page + count))
+    return simulator.SimulatorTransport._Handle(self, request)
+
+
+class ReadRecordsBetweenTest(unittest.TestCase):
+
+  def setUp(self):
+    self.receiver = simulator.SimulatedReceiver(days=7)
+    dex = readdata.Dexcom('sim', transport=simulator.SimulatorTransport(
+        self.receiver))
+    self.records = dex.ReadRecords('EGV_DATA')
+    self.per_page = 500 // database_records.EGVRecord._ClassSize()
+    self.page_count = -(-len(self.records) // self.per_page)
+    self.times = [r.data[0] for r in self.records]
+
+  def _Check(self, start, end):
+    transport = PageCountingTransport(self.receiver)
+    dex = readdata.Dexcom('sim', transport=transport)
+    found = dex.ReadRecordsBetween('EGV_DATA', util.ReceiverTimeToTime(start),
+                                   util.ReceiverTimeToTime(end))
+    expected = [r for r in self.records if start <= r.data[0] <= end]
+    self.assertEqual([r.raw_data for r in found],
+                     [r.raw_data for r in expected])
+    # Each page is read at most once, and besides the pages holding the
+    # window only the pages visited by the two binary searches are read.
+    self.assertEqual(len(transport.pages), len(set(transport.pages)))
+    window = set(self.times.index(r.data[0]) // self.per_page
+                 for r in expected)
+    searches = 2 * int(math.ceil(math.log(self.page_count, 2)))
+    self.assertLessEqual(len(set(transport.pages) - window), searches)
+    return found
+
+  def testFullRange(self):
+    self.assertEqual(len(self._Check(self.times[0], self.times[-1])),
+                     len(self.records))
+
+  def testExactRecord(self):
+    for x in (0, 37, 38, 1000, len(self.times) - 1):
+      self.assertEqual(len(self._Check(self.times[x], self.times[x])), 1)
+
+  def testEmptyWindow(self):
+    self.assertEqual(self._Check(self.times[500] + 1, self.times[501] - 1),
+                     [])
+    self.assertEqual(self._Check(self.times[501], self.times[500]), [])
+
+  def testOutsideData(self):
+    self.assertEqual(self._Check(0, self.times[0] - 1), [])
+    self.assertEqual(self._Check(self.times[-1] + 1, self.times[-1] + 9999),
+                     [])
+
+  def testWindowAcrossPages(self):
+    self.assertEqual(len(self._Check(self.times[30], self.times[200])), 171)
+
+
+if __name__ == '__main__':
+  unittest.main()
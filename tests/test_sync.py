@@ -0,0 +1,54 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from dexcom_reader import constants
+from dexcom_reader import database_records
+from dexcom_reader import readdata
+from dexcom_reader import simulator
+from dexcom_reader import sync
+
+
+class SyncRecordsTest(unittest.TestCase):
+
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+    self.path = os.path.join(self.root, 'checkpoints.json')
+    self.receiver = simulator.SimulatedReceiver(days=1)
+
+  def tearDown(self):
+    shutil.rmtree(self.root)
+
+  def _Sync(self):
+    # A new session and a reloaded checkpoint file for each sync.
+    checkpoints = sync.SyncCheckpoints(self.path)
+    dex = readdata.Dexcom('sim', transport=simulator.SimulatorTransport(
+        self.receiver))
+    records = dex.SyncRecords('EGV_DATA', checkpoints)
+    checkpoints.Save()
+    return [r.raw_data.tobytes() for r in records]
+
+  def testSyncAfterNewRecords(self):
+    everything = self._Sync()
+    self.assertEqual(len(everything), 288)
+    self.assertEqual(self._Sync(), [])
+    last = struct.unpack_from('<I', everything[-1])[0]
+    # Fills the partially full last page and starts two more.
+    added = [simulator._Record(database_records.EGVRecord, t, t - 3600, 100,
+                               chr(4))
+             for t in range(last + 300, last + 300 * 51, 300)]
+    self.receiver.AppendRecords('EGV_DATA', added)
+    self.assertEqual(self._Sync(), added)
+    self.assertEqual(self._Sync(), [])
+
+  def testSaveWithoutPath(self):
+    checkpoints = sync.SyncCheckpoints()
+    checkpoints.Set('SM1', 'EGV_DATA', 3, 1000)
+    self.assertEqual(checkpoints.Get('SM1', 'EGV_DATA'), (3, 1000))
+    self.assertRaises(constants.Error, checkpoints.Save)
+
+
+if __name__ == '__main__':
+  unittest.main()
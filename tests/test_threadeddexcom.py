@@ -0,0 +1,33 @@
+import unittest
+
+from dexcom_reader import readdata
+from dexcom_reader import simulator
+from dexcom_reader import threadeddexcom
+
+
+class ThreadedDexcomTest(unittest.TestCase):
+
+  def testCommandsFollowDexcom(self):
+    for name in ('ReadRecords', 'ReadRTC', 'GetFirmwareHeader',
+                 'CountRecords', 'ToDisplayTime'):
+      self.assertIn(name, threadeddexcom.COMMANDS)
+    self.assertNotIn('IterRecords', threadeddexcom.COMMANDS)
+    self.assertNotIn('readpacket', threadeddexcom.COMMANDS)
+
+  def testFutures(self):
+    dexes = [threadeddexcom.ThreadedDexcom(readdata.Dexcom(
+        'sim', transport=simulator.SimulatorTransport(
+            simulator.SimulatedReceiver(serial_number='SM%d' % x))))
+             for x in range(3)]
+    serials = [dex.GetSerialNumber() for dex in dexes]
+    counts = [dex.CountRecords('EGV_DATA') for dex in dexes]
+    self.assertEqual([f.result(10) for f in serials], ['SM0', 'SM1', 'SM2'])
+    self.assertEqual([f.result(10) for f in counts], [288] * 3)
+    self.assertIsNotNone(dexes[0].ReadRecords('NO_SUCH_TYPE').exception(10))
+    self.assertRaises(AttributeError, getattr, dexes[0], 'IterRecords')
+    for dex in dexes:
+      dex.Close()
+
+
+if __name__ == '__main__':
+  unittest.main()